@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+'''
+Compares module channel encodings: jsonpickle against the binary codec with and without compression.
+
+Usage: python3 benchmarks/codec.py [ -n ITERATIONS ]
+'''
+
+import argparse
+import importlib.machinery
+import importlib.util
+import os
+import sys
+from json import dumps, loads
+from time import perf_counter
+from requests import Request
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+import jsonpickle
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_kiwi():
+
+	# launcher has no extension so its loader is given explicitly
+	loader = importlib.machinery.SourceFileLoader('kiwi_launcher', os.path.join(REPO_DIR, 'kiwi'))
+	module = importlib.util.module_from_spec(importlib.util.spec_from_loader('kiwi_launcher', loader))
+	loader.exec_module(module)
+	return module.Kiwi
+
+def response(body):
+	response = Response()
+	response.status_code = 200
+	response.reason = 'OK'
+	response.url = 'http://localhost/'
+	response.encoding = 'utf-8'
+	response.headers = CaseInsensitiveDict({ 'Content-Type': 'application/json', 'Content-Length': str(len(body)) })
+	response._content = body
+	return response
+
+def payloads():
+	return {
+		"request": Request('GET', '/info/wan', params={ 'name': 'bench' }),
+		"small response": response(b'Hello from kiwi, bench!'),
+		"large response": response(dumps([ { "id": index, "name": "item {}".format(index) } for index in range(5000) ]).encode('utf-8')),
+		"batch of 16": [ response(b'Hello from kiwi, bench!') for _ in range(16) ]
+	}
+
+def bench(encode, decode, payload, iterations):
+
+	encoded = encode(payload)
+
+	start = perf_counter()
+	for _ in range(iterations):
+		encode(payload)
+	encode_time = perf_counter() - start
+
+	start = perf_counter()
+	for _ in range(iterations):
+		decode(encoded)
+	decode_time = perf_counter() - start
+
+	return {
+		"bytes": len(encoded),
+		"encode_us": encode_time / iterations * 1000000,
+		"decode_us": decode_time / iterations * 1000000
+	}
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('-n', '--iterations', type=int, default=500, help='encodes and decodes per payload')
+	args = parser.parse_args()
+
+	Kiwi = load_kiwi()
+
+	codecs = {
+		"jsonpickle": (lambda payload: dumps(jsonpickle.encode(payload)).encode('utf-8'), lambda data: jsonpickle.decode(loads(data))),
+		"binary": (lambda payload: Kiwi.Codec.encode(payload, compress=False), Kiwi.Codec.decode),
+		"binary+zlib": (lambda payload: Kiwi.Codec.encode(payload, compress=True), Kiwi.Codec.decode)
+	}
+
+	for name, payload in payloads().items():
+		print('{}:'.format(name))
+		for codec, (encode, decode) in codecs.items():
+			result = bench(encode, decode, payload, args.iterations)
+			print('{:>14}: {bytes:>8} bytes, encode {encode_us:9.1f}us, decode {decode_us:9.1f}us'.format(codec, **result))
+
+if __name__ == "__main__":
+	sys.exit(main())
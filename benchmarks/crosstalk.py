@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+'''
+Cross-talk check for concurrent serverside module runs. Fires overlapping requests
+at /module/<m>/ of a local kiwi server started from this repository.
+
+Every request carries its own token. The serverside module runs a helper module in
+the background with the token as its arguments, which echoes its argv to stdout a few
+times while yielding to other requests in between. The response holds the argv the
+helper module saw and the stdout captured from it, both must only ever contain the
+token of their own request.
+
+Usage: python3 benchmarks/crosstalk.py [ -n REQUESTS ] [ -c CONCURRENCY ] [ --pool ]
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from json import loads
+
+from run import Environment, load_kiwi
+
+ECHO_MODULE = 'crosstalk_echo'
+ECHOES = 5
+
+# serverside module: runs the echo module in the background and returns what it saw
+SERVER_MODULE = '''
+from json import dumps
+from flask import Flask, request
+
+app = Flask(__name__)
+KIWI = None
+
+@app.route('/')
+def run():
+	argv, stdout = KIWI.module('{}', request.args['token'], foreground=False)
+	return dumps({{ "argv": argv, "stdout": stdout }})
+
+def kiwi_main(kiwi, helper):
+
+	# kiwi helper is created once per module, so every run sets the same one
+	global KIWI
+	KIWI = kiwi
+
+	return helper.ingress.handle(app)
+'''.format(ECHO_MODULE)
+
+# echo module: writes its argv and yields between writes so runs interleave
+ECHO_MODULE_SOURCE = '''
+import sys
+from random import random
+from gevent import sleep
+
+def kiwi_main(kiwi):
+
+	for _ in range({}):
+		print(" ".join(sys.argv[1:]))
+		sleep(random() * 0.002)
+
+	return sys.argv[1:]
+'''.format(ECHOES)
+
+def check(token, response):
+
+	assert response.status_code == 200, "request {} failed with {}".format(token, response.status_code)
+
+	# argv of the run and every line it wrote must be its own
+	result = loads(response.text)
+	problems = []
+
+	if result["argv"] != [ token ]:
+		problems.append("argv {}".format(result["argv"]))
+
+	lines = result["stdout"].splitlines()
+	if lines != [ token ] * ECHOES:
+		problems.append("stdout {}".format(lines))
+
+	return problems
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('-n', '--requests', type=int, default=2000, help='requests to fire')
+	parser.add_argument('-c', '--concurrency', type=int, default=32, help='requests in flight at once')
+	parser.add_argument('--pool', action='store_true', help='run serverside modules in worker pools')
+	args = parser.parse_args()
+
+	from requests import Request
+
+	environment = Environment(0)
+	failures = []
+
+	try:
+
+		environment.sources = { 'crosstalk': { 'server.py': SERVER_MODULE }, ECHO_MODULE: { 'client.py': ECHO_MODULE_SOURCE } }
+		environment.start_server({ "api": { "pool": { "enabled": args.pool, "size": 4 } } })
+
+		kiwi_module = load_kiwi()
+		os.environ['HOME'] = environment.client_home()
+		with contextlib.redirect_stdout(io.StringIO()):
+			helper = kiwi_module.Kiwi().get_helper('crosstalk')
+
+		def _request(token):
+			return check(token, helper.request(Request('GET', '/', params={ 'token': token })))
+
+		with ThreadPoolExecutor(args.concurrency) as executor:
+			futures = { executor.submit(_request, 'token-{}'.format(index)): 'token-{}'.format(index) for index in range(args.requests) }
+			for future in as_completed(futures):
+				try:
+					problems = future.result()
+				except Exception as e:
+					problems = [ "{}: {}".format(type(e).__name__, e) ]
+
+				if problems:
+					failures.append("{}: {}".format(futures[future], ", ".join(problems)))
+
+	finally:
+		environment.stop()
+
+	print("{} concurrent requests, {} with cross-talk or errors".format(args.requests, len(failures)))
+	for failure in failures[:20]:
+		print("FAIL: {}".format(failure), file=sys.stderr)
+
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
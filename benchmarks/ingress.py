@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+'''
+Compares serverside ingress modes: in process WSGI dispatch against a throwaway unix socket server.
+
+Usage: python3 benchmarks/ingress.py [ -n ITERATIONS ]
+'''
+
+import argparse
+import importlib.util
+import os
+import sys
+from time import perf_counter
+from requests import Request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load(name, path):
+	spec = importlib.util.spec_from_file_location(name, path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def bench(server, app, mode, iterations):
+
+	timings = []
+
+	for _ in range(iterations):
+		start = perf_counter()
+		helper = server.ServerHelper(Request('GET', params={ 'name': 'bench' }), {}, mode)
+		response = helper.ingress.handle(app)
+		helper.__del__()
+		timings.append(perf_counter() - start)
+
+		assert response is not None and response.status_code == 200, "ingress failed in {} mode".format(mode.value)
+
+	timings.sort()
+	return {
+		"mode": mode.value,
+		"iterations": iterations,
+		"mean_ms": sum(timings) / len(timings) * 1000,
+		"p50_ms": timings[len(timings) // 2] * 1000,
+		"p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+	}
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('-n', '--iterations', type=int, default=200, help='requests per mode')
+	args = parser.parse_args()
+
+	server = load('kiwi_server', os.path.join(REPO_DIR, 'runtime', 'server.py'))
+	app = load('helloworld_server', os.path.join(REPO_DIR, 'modules', 'helloworld', 'server.py')).app
+
+	for mode in server.ServerHelper.Ingress.Mode:
+		result = bench(server, app, mode, args.iterations)
+		print('{mode:>10}: mean {mean_ms:.3f}ms, p50 {p50_ms:.3f}ms, p99 {p99_ms:.3f}ms ({iterations} requests)'.format(**result))
+
+if __name__ == "__main__":
+	sys.exit(main())
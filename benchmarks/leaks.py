@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+'''
+Resource leak check for the serverside module route. Fires requests at a local kiwi
+server started from this repository and samples its open file descriptors (summed
+over the server and its forked children) and attached log handlers as it goes.
+
+Both are expected to settle after the first requests and stay flat from then on,
+the check fails once either grows past its warmed up baseline.
+
+Usage: python3 benchmarks/leaks.py [ -n REQUESTS ] [ -s SAMPLES ] [ --pool ]
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+from run import Environment, load_kiwi
+
+# descriptors which may come and go between samples, such as keep-alive connections
+FD_SLACK = 4
+
+def descendants(pid):
+
+	# children of every thread of the process, then theirs
+	pids = [ pid ]
+	for task in os.listdir('/proc/{}/task'.format(pid)):
+		with contextlib.suppress(OSError), open('/proc/{}/task/{}/children'.format(pid, task)) as children:
+			for child in children.read().split():
+				pids.extend(descendants(int(child)))
+
+	return pids
+
+def open_fds(pid):
+
+	count = 0
+	for process in descendants(pid):
+		with contextlib.suppress(OSError):
+			count += len(os.listdir('/proc/{}/fd'.format(process)))
+
+	return count
+
+def log_handlers(session, environment):
+
+	# exported by the api component along with its other metrics
+	metrics = session.get('http://127.0.0.1:{}/metrics'.format(environment.port), timeout=10).text
+	for line in metrics.splitlines():
+		if line.startswith('kiwi_log_handlers '):
+			return int(float(line.split()[1]))
+
+	raise RuntimeError("server does not export kiwi_log_handlers")
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('-n', '--requests', type=int, default=10000, help='requests to fire')
+	parser.add_argument('-s', '--samples', type=int, default=10, help='resource samples taken along the way')
+	parser.add_argument('--pool', action='store_true', help='run serverside modules in worker pools')
+	args = parser.parse_args()
+
+	from requests import Request
+
+	environment = Environment(0)
+	failures = []
+
+	try:
+		environment.start_server({ "api": { "pool": { "enabled": args.pool, "size": 2 } } })
+		pid = environment.server.pid
+
+		kiwi_module = load_kiwi()
+		os.environ['HOME'] = environment.client_home()
+		kiwi = kiwi_module.Kiwi()
+		helper = kiwi.get_helper('helloworld')
+		session = kiwi_module.Kiwi.Helper.session()
+
+		# distinct names keep the response cache from answering in place of the module
+		def _request(index):
+			response = helper.request(Request('GET', '/', params={ 'name': 'leak{}'.format(index) }))
+			assert response.status_code == 200, "request {} failed with {}".format(index, response.status_code)
+
+		# baseline is taken once every lazily opened resource is in place
+		warmup = min(100, args.requests)
+		with contextlib.redirect_stdout(io.StringIO()):
+			for index in range(warmup):
+				_request(index)
+
+		baseline = (open_fds(pid), log_handlers(session, environment))
+		print("{:>8} requests: {:5} fds, {:3} log handlers (baseline)".format(warmup, *baseline))
+
+		interval = max(1, (args.requests - warmup) // max(1, args.samples))
+		for index in range(warmup, args.requests):
+
+			with contextlib.redirect_stdout(io.StringIO()):
+				_request(index)
+
+			if (index + 1 - warmup) % interval == 0 or index + 1 == args.requests:
+
+				fds, handlers = open_fds(pid), log_handlers(session, environment)
+				print("{:>8} requests: {:5} fds, {:3} log handlers".format(index + 1, fds, handlers))
+
+				if fds > baseline[0] + FD_SLACK:
+					failures.append("open fds grew from {} to {} after {} requests".format(baseline[0], fds, index + 1))
+				if handlers != baseline[1]:
+					failures.append("log handlers changed from {} to {} after {} requests".format(baseline[1], handlers, index + 1))
+
+	finally:
+		environment.stop()
+
+	for failure in failures:
+		print("FAIL: {}".format(failure), file=sys.stderr)
+
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark suite for the launcher, runtime and modules. Runs offline against a
+local kiwi server started from this repository in a throwaway home directory.
+
+Measures:
+  * cold (fresh home, module fetch included) and warm launcher startup
+  * Kiwi.import_module of every bundled module, first and manifest cached imports
+  * fetch_modules and up_to_date checks for N generated modules
+  * Configurator export and import of the default config
+  * Helper.request round trips through the /module/ route and ServerHelper.Ingress
+
+Results are written as json, pass a previous result file with --compare to see relative changes.
+
+Usage: python3 benchmarks/run.py [ -n ITERATIONS ] [ -m MODULES ] [ -o OUTPUT ] [ --compare PREVIOUS ]
+'''
+
+import argparse
+import contextlib
+import importlib.machinery
+import importlib.util
+import io
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from json import dumps, loads
+from time import perf_counter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCHER = os.path.join(REPO_DIR, 'kiwi')
+
+def load_kiwi():
+
+	# launcher has no extension so its loader is given explicitly
+	loader = importlib.machinery.SourceFileLoader('kiwi_launcher', LAUNCHER)
+	module = importlib.util.module_from_spec(importlib.util.spec_from_loader('kiwi_launcher', loader))
+	loader.exec_module(module)
+	return module
+
+def summarize(timings):
+
+	timings = sorted(timings)
+	return {
+		"iterations": len(timings),
+		"mean_ms": sum(timings) / len(timings) * 1000,
+		"min_ms": timings[0] * 1000,
+		"p50_ms": timings[len(timings) // 2] * 1000,
+		"p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+		"max_ms": timings[-1] * 1000
+	}
+
+def measure(func, iterations, setup=None):
+
+	timings = []
+	for _ in range(iterations):
+		if setup:
+			setup()
+		start = perf_counter()
+		func()
+		timings.append(perf_counter() - start)
+
+	return summarize(timings)
+
+def free_port():
+	with socket.socket() as probe:
+		probe.bind(('127.0.0.1', 0))
+		return probe.getsockname()[1]
+
+def merge(base, override):
+
+	merged = dict(base)
+	for key, value in override.items():
+		merged[key] = merge(merged[key], value) if isinstance(value, dict) and isinstance(merged.get(key), dict) else value
+
+	return merged
+
+def write_json(path, content):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'w') as json_file:
+		json_file.write(dumps(content))
+
+class Environment:
+
+	def __init__(self, modules):
+		self.root = tempfile.mkdtemp(prefix='kiwi-bench-')
+		self.port = free_port()
+		self.server_home = os.path.join(self.root, 'server')
+		self.generated = [ 'bench{}'.format(index) for index in range(modules) ]
+		self.sources = {}
+		self.server = None
+
+	def kiwi_dir(self, home):
+		return os.path.join(home, '.kiwi')
+
+	def client_home(self, name='client'):
+
+		# fresh client home with the repository runtime and a config pointing at the local server
+		home = os.path.join(self.root, name)
+		shutil.rmtree(home, ignore_errors=True)
+		shutil.copytree(os.path.join(REPO_DIR, 'runtime'), os.path.join(self.kiwi_dir(home), 'runtime'))
+
+		remote = 'http://127.0.0.1:{}'.format(self.port)
+		write_json(os.path.join(self.kiwi_dir(home), 'kiwi.json'), {
+			"remote": {
+				"api": remote + "/api/",
+				"raw": remote + "/assets/",
+				"bundles": remote + "/bundles/",
+				"serverside_endpoint": remote
+			}
+		})
+
+		return home
+
+	def start_server(self, server_config=None):
+
+		kiwi_dir = self.kiwi_dir(self.server_home)
+		shutil.copytree(os.path.join(REPO_DIR, 'runtime'), os.path.join(kiwi_dir, 'runtime'))
+		shutil.copytree(os.path.join(REPO_DIR, 'modules'), os.path.join(kiwi_dir, 'modules'))
+
+		# generated modules for asset sync measurements
+		for module in self.generated:
+			os.makedirs(os.path.join(kiwi_dir, 'modules', module))
+			with open(os.path.join(kiwi_dir, 'modules', module, 'client.py'), 'w') as module_file:
+				module_file.write("def kiwi_main(kiwi):\n\tprint('{}')\n".format(module))
+			with open(os.path.join(kiwi_dir, 'modules', module, 'meta.txt'), 'w') as meta_file:
+				meta_file.write("generated benchmark module\n")
+
+		# modules given as sources, { module: { side file: source } }
+		for module, sides in self.sources.items():
+			os.makedirs(os.path.join(kiwi_dir, 'modules', module), exist_ok=True)
+			for side, source in sides.items():
+				with open(os.path.join(kiwi_dir, 'modules', module, side), 'w') as module_file:
+					module_file.write(source)
+
+		# server config may be extended per run, e.g. to enable module pools
+		write_json(os.path.join(kiwi_dir, 'kiwi.json'), {
+			"local": { "server": merge({ "daemon": { "foreground": True }, "api": { "host": "127.0.0.1", "port": self.port } }, server_config or {}) }
+		})
+
+		self.server = subprocess.Popen([ sys.executable, LAUNCHER, '-S' ], cwd=self.server_home,
+									   env=dict(os.environ, HOME=self.server_home),
+									   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+		# wait for the listener
+		deadline = time.time() + 30
+		while time.time() < deadline:
+			with contextlib.suppress(OSError), socket.create_connection(('127.0.0.1', self.port), timeout=0.2):
+				return
+			time.sleep(0.1)
+
+		raise RuntimeError("local kiwi server did not start on port {}".format(self.port))
+
+	def stop(self):
+
+		if self.server:
+			self.server.terminate()
+			with contextlib.suppress(subprocess.TimeoutExpired):
+				self.server.wait(timeout=10)
+			if self.server.poll() is None:
+				self.server.kill()
+
+		shutil.rmtree(self.root, ignore_errors=True)
+
+def run_launcher(home, *arguments):
+	subprocess.run([ sys.executable, LAUNCHER ] + list(arguments), cwd=home, env=dict(os.environ, HOME=home),
+				   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+def bench_startup(environment, iterations):
+
+	results = {}
+
+	# every cold run starts from a fresh home so the module is fetched first
+	home = [ None ]
+	def _fresh_home():
+		home[0] = environment.client_home('startup')
+
+	results["startup_cold"] = measure(lambda: run_launcher(home[0], 'helloworld', '-n', 'bench'), max(1, iterations // 4), _fresh_home)
+
+	home[0] = environment.client_home('startup')
+	run_launcher(home[0], 'helloworld', '-n', 'bench')
+	results["startup_warm"] = measure(lambda: run_launcher(home[0], 'helloworld', '-n', 'bench'), iterations)
+	results["startup_help"] = measure(lambda: run_launcher(home[0], '-h'), iterations)
+
+	return results
+
+def bench_import(kiwi_module, environment, iterations):
+
+	Kiwi = kiwi_module.Kiwi
+	results = {}
+	modules_dir = os.path.join(environment.kiwi_dir(environment.server_home), 'modules')
+	manifests_dir = tempfile.mkdtemp(dir=environment.root)
+
+	for module in sorted(os.listdir(modules_dir)):
+		if module in environment.generated:
+			continue
+
+		for side in Kiwi.Side:
+			path = os.path.join(modules_dir, module, side.value)
+			if not os.path.isfile(path):
+				continue
+
+			name = "import_module[{}/{}]".format(module, side.name.lower())
+			manifest_path = os.path.join(manifests_dir, "{}-{}.json".format(module, side.name.lower()))
+
+			try:
+				# first import parses the module for its dependencies, later ones skip it by manifest
+				results[name + "_first"] = measure(lambda: Kiwi.import_module(module, path, manifest_path), 1)
+				results[name + "_cached"] = measure(lambda: Kiwi.import_module(module, path, manifest_path), iterations)
+			except BaseException as e:
+				results[name] = { "error": "{}: {}".format(type(e).__name__, e) }
+
+	return results
+
+def bench_assets(kiwi_module, environment, iterations):
+
+	Kiwi = kiwi_module.Kiwi
+	home = environment.client_home('assets')
+	os.environ['HOME'] = home
+	modules = environment.generated
+	kiwi = [ None ]
+
+	def _fresh():
+		shutil.rmtree(os.path.join(environment.kiwi_dir(home), 'modules'), ignore_errors=True)
+		kiwi[0] = Kiwi()
+
+	def _fetch():
+		with contextlib.redirect_stdout(io.StringIO()):
+			_, _, failed = kiwi[0].fetch_modules(modules, quiet=True)
+		assert not failed, "failed to fetch {}".format(failed)
+
+	results = { "fetch_modules[{}]".format(len(modules)): measure(_fetch, max(1, iterations // 4), _fresh) }
+
+	# every module is now installed and current
+	def _check():
+		kiwi[0] = Kiwi()
+
+	results["fetch_modules_up_to_date[{}]".format(len(modules))] = measure(_fetch, max(1, iterations // 4), _check)
+
+	def _up_to_date():
+		assets = kiwi[0].runtime.assets
+		assert all(assets.up_to_date(assets.module(module)) for module in modules)
+
+	results["up_to_date[{}]".format(len(modules))] = measure(_up_to_date, iterations)
+
+	return results
+
+def bench_config(kiwi_module, iterations):
+
+	Utils, Kiwi = kiwi_module.Utils, kiwi_module.Kiwi
+	config = Kiwi.Config()
+	exported = Utils.Configurator.export(config)
+
+	return {
+		"configurator_export": measure(lambda: Utils.Configurator.export(config), iterations * 10),
+		"configurator_import": measure(lambda: Utils.Configurator.import_(Kiwi.Config(), exported), iterations * 10)
+	}
+
+def bench_request(kiwi_module, environment, iterations):
+
+	from requests import Request
+
+	Kiwi = kiwi_module.Kiwi
+	os.environ['HOME'] = environment.client_home('request')
+	kiwi = Kiwi()
+	helper = kiwi.get_helper('helloworld')
+
+	def _request():
+		response = helper.request(Request('GET', '/', params={ 'name': 'bench' }))
+		assert response.status_code == 200
+
+	_request()
+	results = { "helper_request": measure(_request, iterations) }
+
+	# same round trip over the jsonpickle fallback
+	kiwi.config.remote.codec = "jsonpickle"
+	results["helper_request_jsonpickle"] = measure(_request, iterations)
+	kiwi.config.remote.codec = Kiwi.Codec.NAME
+
+	batch = [ Request('GET', '/', params={ 'name': 'bench{}'.format(index) }) for index in range(16) ]
+	results["helper_request_batch[16]"] = measure(lambda: helper.request_batch(batch), iterations)
+
+	return results
+
+def git_revision():
+	with contextlib.suppress(OSError, subprocess.CalledProcessError):
+		return subprocess.run([ 'git', 'rev-parse', 'HEAD' ], cwd=REPO_DIR, capture_output=True, check=True, text=True).stdout.strip()
+	return None
+
+def compare(results, previous_path):
+
+	with open(previous_path, 'r') as previous_file:
+		previous = loads(previous_file.read())["results"]
+
+	print("\ncompared to {}:".format(previous_path))
+	for name, result in results.items():
+		before = previous.get(name, {})
+		if "p50_ms" in result and "p50_ms" in before:
+			change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0
+			print("{:>48}: p50 {:9.3f}ms -> {:9.3f}ms ({:+.1f}%)".format(name, before["p50_ms"], result["p50_ms"], change))
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('-n', '--iterations', type=int, default=20, help='iterations per measurement')
+	parser.add_argument('-m', '--modules', type=int, default=50, help='generated modules for asset sync measurements')
+	parser.add_argument('-o', '--output', type=str, default=None, help='result json path (default: benchmarks/results/<timestamp>.json)')
+	parser.add_argument('--compare', type=str, metavar='PREVIOUS', help='previous result json to compare against')
+	args = parser.parse_args()
+
+	# dependency resolution must never reach out to a package index
+	os.environ['PIP_NO_INDEX'] = '1'
+
+	environment = Environment(args.modules)
+	results = {}
+
+	try:
+		environment.start_server()
+		kiwi_module = load_kiwi()
+
+		for suite in [
+			lambda: bench_startup(environment, args.iterations),
+			lambda: bench_import(kiwi_module, environment, args.iterations),
+			lambda: bench_assets(kiwi_module, environment, args.iterations),
+			lambda: bench_config(kiwi_module, args.iterations),
+			lambda: bench_request(kiwi_module, environment, args.iterations)
+		]:
+			with contextlib.redirect_stdout(io.StringIO()):
+				results.update(suite())
+
+	finally:
+		environment.stop()
+
+	for name, result in results.items():
+		if "error" in result:
+			print("{:>48}: {}".format(name, result["error"]))
+		else:
+			print("{:>48}: p50 {p50_ms:9.3f}ms, p99 {p99_ms:9.3f}ms ({iterations} runs)".format(name, **result))
+
+	output = args.output or os.path.join(REPO_DIR, 'benchmarks', 'results', '{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S')))
+	write_json(output, {
+		"timestamp": datetime.now().isoformat(),
+		"revision": git_revision(),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"iterations": args.iterations,
+		"modules": args.modules,
+		"results": results
+	})
+	print("\nresults written to {}".format(output))
+
+	if args.compare:
+		compare(results, args.compare)
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -8,7 +8,8 @@
 # On the same kiwi host.
 #
 # In order to solve this problem, kiwi provides a helper ingress object.
-# It accepts a WSGI app, starts it on a UNIX socket and runs the request against it.
+# It accepts a WSGI app and runs the request against it (directly in process by default,
+# or on a throwaway UNIX socket server if so configured).
 # The resulting response object can be safely returned to the client.
 
 from socket import gethostname
@@ -16,6 +17,9 @@ from flask import Flask, request
 
 app = Flask(__name__)
 
+# greetings only depend on the request itself, so kiwi may serve repeated ones from its response cache
+kiwi_cache = { "ttl": 60 }
+
 @app.route('/')
 def greet():
 
@@ -139,7 +139,7 @@ def kiwi_main(kiwi):
 
 			# get appropriate info
 			info_json = {
-				"wan": lambda: loads(kiwi.request(Request('GET', '/info/wan')).text),
+				"wan": lambda: loads(kiwi.request(Request('GET', '/info/wan'), ttl=60, stale=600).text),
 				"lan": lambda: psutil.net_if_addrs(),
 				"ram": lambda: psutil.virtual_memory()._asdict(),
 				"swap": lambda: psutil.swap_memory()._asdict(),
@@ -1,18 +1,24 @@
 #!/usr/bin/env python3
 
-from flask import Flask
+from flask import Flask, request
 from json import dumps
 
 app = Flask(__name__)
 
 ENVIRONMENT = None
 
+# wan address only depends on the caller address
+kiwi_cache = { "ttl": 60, "environ": [ "REMOTE_ADDR" ] }
+
 @app.route('/info/wan')
 def net():
 
+    # in process ingress passes request environment along with the request itself
+    environment = request.environ.get('kiwi.ingress.environment', ENVIRONMENT)
+
     # various client info
     return dumps({
-        "ip": ENVIRONMENT['REMOTE_ADDR']
+        "ip": environment['REMOTE_ADDR']
     })
 
 def kiwi_main(_, helper):
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import socket
+import signal
+import struct
+import traceback
+from contextlib import contextmanager
+from json import loads
+from select import select
+
+# invocations carry argv, cwd and environment as json along with the caller's stdin, stdout and stderr
+MAX_INVOCATION = 1048576
+STDIO = 3
+BACKLOG = 64
+
+# seconds between checks on helpers resolving dependencies of modules to warm
+WARM_POLL = 0.5
+
+# modules whose dependencies are being resolved by a helper, by helper pid, and exit codes of finished helpers
+WARMING = {}
+WARMED = {}
+
+def socket_path(kiwi):
+	return kiwi.Helper.join(kiwi.config.local.home_dir, "agent.sock")
+
+def receive(connection):
+
+	# length prefixed invocation, descriptors arrive with its first chunk
+	data, fds, _, _ = socket.recv_fds(connection, MAX_INVOCATION, STDIO)
+	if len(data) < 4:
+		raise ValueError("truncated invocation")
+
+	length = struct.unpack('!I', data[:4])[0]
+	if length > MAX_INVOCATION:
+		raise ValueError("invocation too large")
+
+	while len(data) < length + 4:
+		chunk = connection.recv(length + 4 - len(data))
+		if not chunk:
+			raise ValueError("truncated invocation")
+		data += chunk
+
+	if len(fds) != STDIO:
+		raise ValueError("expected {} descriptors, got {}".format(STDIO, len(fds)))
+
+	return loads(data[4:4 + length]), fds
+
+def reap(*_):
+
+	# children are reaped as they exit, helpers leave their exit code for the accept loop
+	while True:
+		try:
+			pid, status = os.waitpid(-1, os.WNOHANG)
+		except ChildProcessError:
+			return
+
+		if pid == 0:
+			return
+
+		if pid in WARMING:
+			WARMED[pid] = os.waitstatus_to_exitcode(status)
+
+@contextmanager
+def child_status():
+
+	# pip is run as a subprocess whose exit status must not be reaped here
+	signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+	try:
+		yield
+	finally:
+		signal.signal(signal.SIGCHLD, reap)
+		reap()
+
+def warm(kiwi, listener, connection, module):
+
+	# modules are imported by the agent once used so later invocations fork with them loaded,
+	# a helper resolves their dependencies first as installing them may take a while
+	if not kiwi.is_installed(module) or module in WARMING.values():
+		return
+
+	path = kiwi.runtime.assets.module(module).local
+	if kiwi.module_cache.cached(path):
+		return
+
+	pid = os.fork()
+	if pid == 0:
+
+		exit_code = 1
+		try:
+			listener.close()
+			connection.close()
+			signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+			signal.signal(signal.SIGTERM, signal.SIG_DFL)
+			kiwi.after_fork()
+
+			# module is only warmed once its dependencies are in place
+			kiwi.module_cache.load(module, path)
+			exit_code = 0 if kiwi.module_cache.resolved(path) else 1
+
+		except BaseException:
+			pass
+
+		finally:
+			kiwi.Logs.flush()
+			os._exit(exit_code)
+
+	WARMING[pid] = module
+
+def warmed(kiwi):
+
+	# modules whose dependencies were resolved are imported by the agent itself
+	for pid in list(WARMED):
+
+		module = WARMING.pop(pid)
+		if WARMED.pop(pid) != 0 or not kiwi.is_installed(module):
+			continue
+
+		try:
+			with child_status():
+				kiwi.module_cache.load(module, kiwi.runtime.assets.module(module).local)
+		except BaseException:
+			pass
+
+def invoke(kiwi, argv):
+
+	parser = kiwi.argument_parser()
+	if not argv:
+		parser.print_help()
+		return 0
+
+	args = parser.parse_args(argv)
+	if args.start_server or args.agent:
+		kiwi.say("server and agent can not be started through the agent")
+		return 1
+
+	# invocations with their own config or side get a kiwi of their own
+	if not (args.config or args.server):
+		kiwi.runtime.run(kiwi.runtime.Modules.Client, kiwi, args)
+		return 0
+
+	own = type(kiwi)(args.config, args.server)
+	try:
+		own.runtime.run(own.runtime.Modules.Client, own, args)
+	finally:
+		own.cleanup()
+
+	return 0
+
+def child(kiwi, listener, connection, fds, invocation):
+
+	exit_code = 1
+	cache_dir = kiwi.config.local.client.cache_dir
+
+	try:
+
+		# connections are accepted by the agent only
+		listener.close()
+
+		# shim forwards its signals to this pid
+		connection.sendall(struct.pack('!i', os.getpid()))
+		signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+		signal.signal(signal.SIGTERM, signal.SIG_DFL)
+		signal.signal(signal.SIGINT, signal.default_int_handler)
+
+		# take over the caller's stdio, streams are reopened as the caller may be a terminal
+		for target, fd in enumerate(fds):
+			os.dup2(fd, target)
+			os.close(fd)
+
+		sys.stdin = open(0, 'r', closefd=False)
+		sys.stdout = open(1, 'w', buffering=1 if os.isatty(1) else -1, closefd=False)
+		sys.stderr = open(2, 'w', buffering=1, errors='backslashreplace', closefd=False)
+
+		os.chdir(invocation['cwd'])
+		os.environ.clear()
+		os.environ.update(invocation['env'])
+		sys.argv = sys.argv[:1] + invocation['argv']
+		kiwi.after_fork()
+
+		exit_code = invoke(kiwi, invocation['argv'])
+
+	except SystemExit as e:
+		if e.code is None or isinstance(e.code, int):
+			exit_code = e.code or 0
+		else:
+			print(e.code, file=sys.stderr)
+	except KeyboardInterrupt:
+		exit_code = 130
+	except BaseException:
+		traceback.print_exc()
+
+	finally:
+
+		try:
+			sys.stdout.flush()
+			sys.stderr.flush()
+		except BaseException:
+			pass
+
+		kiwi.Logs.flush()
+
+		# os._exit skips Kiwi.__del__, so a temporary cache created by this invocation is removed here
+		if kiwi.config.local.client.cache_dir != cache_dir:
+			kiwi.cleanup()
+
+		try:
+			connection.sendall(struct.pack('!i', exit_code))
+		except OSError:
+			pass
+
+		os._exit(exit_code)
+
+def handle(kiwi, listener, connection):
+
+	# only invocations of the user running the agent are served
+	_, uid, _ = struct.unpack('3i', connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+	if uid != os.getuid():
+		return
+
+	try:
+		invocation, fds = receive(connection)
+	except (ValueError, KeyError, OSError) as e:
+		kiwi.say("dropped invocation: {}".format(e))
+		return
+
+	# output written so far must not be flushed twice
+	sys.stdout.flush()
+	sys.stderr.flush()
+
+	pid = os.fork()
+	if pid == 0:
+		child(kiwi, listener, connection, fds, invocation)
+
+	for fd in fds:
+		os.close(fd)
+
+	if invocation['argv']:
+		warm(kiwi, listener, connection, invocation['argv'][0])
+
+def updated(watched):
+
+	try:
+		return any(os.stat(path).st_mtime_ns != mtime for path, mtime in watched.items())
+	except OSError:
+		return True
+
+def run(kiwi, args):
+
+	path = socket_path(kiwi)
+
+	# only one agent per home
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+		try:
+			probe.connect(path)
+		except (FileNotFoundError, ConnectionRefusedError):
+			pass
+		else:
+			kiwi.say("agent is already running on {}".format(path))
+			sys.exit(1)
+
+	if os.path.exists(path):
+		os.remove(path)
+
+	# socket is only accessible by its owner
+	listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	umask = os.umask(0o077)
+	try:
+		listener.bind(path)
+	finally:
+		os.umask(umask)
+	listener.listen(BACKLOG)
+
+	# runtime is loaded ahead, shim is installed alongside it
+	kiwi.runtime.load(kiwi.runtime.Modules.Client)
+	kiwi.runtime.load(kiwi.runtime.Modules.Module)
+	shim = kiwi.runtime.asset(kiwi.runtime.Modules.Shim).local
+
+	# children are reaped as they exit, sigterm unwinds through the cleanup below
+	signal.signal(signal.SIGCHLD, reap)
+	signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+	# agent restarts itself once the launcher or this runtime module is updated
+	launcher = os.path.abspath(sys.argv[0])
+	watched = { path_: os.stat(path_).st_mtime_ns for path_ in (launcher, os.path.abspath(__file__)) }
+
+	kiwi.say("agent listening on {}, run modules with '{} -S {} <module>'".format(path, sys.executable, shim))
+	sys.stdout.flush()
+
+	try:
+		while True:
+
+			# modules are warmed between invocations
+			warmed(kiwi)
+			if WARMING and not select([ listener ], [], [], WARM_POLL)[0]:
+				continue
+
+			connection, _ = listener.accept()
+			with connection:
+
+				# updates are picked up before serving, an invocation left unanswered is run by the shim itself
+				if updated(watched):
+					break
+
+				try:
+					handle(kiwi, listener, connection)
+				except OSError as e:
+					kiwi.say("invocation failed: {}".format(e))
+
+	except KeyboardInterrupt:
+		return
+
+	finally:
+		listener.close()
+		if os.path.exists(path):
+			os.remove(path)
+
+	kiwi.say("agent was updated, restarting")
+	sys.stdout.flush()
+	os.execv(sys.executable, [ sys.executable, launcher ] + list(sys.argv[1:]))
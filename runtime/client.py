@@ -1,8 +1,6 @@
 #!/usr/bin/env python3
 
-import os
 import sys
-import requests
 import shlex
 
 def bulleted_list(preface, items):
@@ -19,6 +17,8 @@ def run(kiwi, args):
 
 	# list modules
 	if args.list_modules:
+		import requests
+
 		installed = kiwi.get_installed_module_list()
 			
 		# try getting remote module list
@@ -47,6 +47,8 @@ def run(kiwi, args):
 				
 			# collect remote module list if fetching, local list if updating
 			if args.get_modules is not None:
+				import requests
+
 				try:
 					modules = kiwi.get_remote_module_list()
 				except requests.exceptions.RequestException:
@@ -98,6 +100,10 @@ def run(kiwi, args):
 	if args.start_server:
 		return kiwi.runtime.run(kiwi.runtime.Modules.Server, kiwi)
 
+	# start kiwi agent
+	if getattr(args, 'agent', False):
+		return kiwi.runtime.run(kiwi.runtime.Modules.Agent, kiwi, args)
+
 	# run kiwi module
 	if args.module:
-		return kiwi.run_module(args.module[0], shlex.join(args.module[1:]), client=(not args.server), foreground=True)
+		return kiwi.run_module(args.module[0], shlex.join(args.module[1:]), client=(not args.server), foreground=True, profile=getattr(args, 'profile', False))
@@ -1,7 +1,67 @@
 #!/usr/bin/env python3
 
 import sys
-from os import chdir
+from os import chdir, listdir, remove
+from os.path import getmtime
+from threading import Lock
+
+# profiling reports kept per module
+PROFILES_KEPT = 20
+
+# allocation tracking is process wide so only one run tracks it at a time
+TRACING_LOCK = Lock()
+
+# runs of a server share threads, so one run is profiled at a time and the others run as is
+PROFILING_LOCK = Lock()
+
+def profiled(kiwi, helper, main, *args):
+
+	import cProfile
+	import tracemalloc
+	from datetime import datetime
+
+	report_path = kiwi.Helper.join(helper.module_home, "profile-{}-{}".format(kiwi.config.side.name.lower(), datetime.now().strftime("%Y%m%d-%H%M%S-%f")))
+
+	with TRACING_LOCK:
+		tracing = not tracemalloc.is_tracing()
+		if tracing:
+			tracemalloc.start(10)
+
+	before = tracemalloc.take_snapshot() if tracing else None
+	profiler = cProfile.Profile()
+
+	try:
+		return profiler.runcall(main, helper, *args)
+
+	finally:
+
+		# allocations made during the run, largest first
+		if tracing:
+			after = tracemalloc.take_snapshot().filter_traces([ tracemalloc.Filter(False, cProfile.__file__), tracemalloc.Filter(False, tracemalloc.__file__) ])
+			_, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+
+			with open(report_path + ".memory.txt", 'w') as report:
+				report.write("peak traced memory: {:.1f} KiB\n\n".format(peak / 1024))
+				for statistic in after.compare_to(before, 'lineno')[:30]:
+					report.write("{}\n".format(statistic))
+
+		# cpu profile in pstats format (snakeviz, gprof2dot, python -m pstats)
+		profiler.dump_stats(report_path + ".prof")
+
+		# drop oldest reports, grouped by run as not every run writes an allocation report
+		reports = {}
+		for entry in listdir(helper.module_home):
+			if entry.startswith("profile-"):
+				reports.setdefault(entry.split('.', 1)[0], []).append(entry)
+
+		for stem in sorted(reports, key=lambda stem: max(getmtime(kiwi.Helper.join(helper.module_home, entry)) for entry in reports[stem]))[:-PROFILES_KEPT]:
+			for entry in reports[stem]:
+				remove(kiwi.Helper.join(helper.module_home, entry))
+
+		helper.logger.info("profile written to {}.prof".format(report_path))
+		if kiwi.config.side is kiwi.Side.Client:
+			print("{}: profile written to {}.prof".format(kiwi.Config.kiwi_name, report_path), file=sys.stderr)
 
 def run(kiwi, *args):
 
@@ -9,7 +69,7 @@ def run(kiwi, *args):
 	module_name = sys.argv[0]
 
 	# if module is not installed - see if it exists on remote
-	if module_name not in kiwi.get_installed_module_list():
+	if not kiwi.is_installed(module_name):
 		if module_name not in kiwi.get_remote_module_list():
 			kiwi.say("I don't have a module called '{}' :(".format(module_name))
 			sys.exit(1)
@@ -21,7 +81,7 @@ def run(kiwi, *args):
 				sys.exit(1)
 
 	# import module code
-	module = kiwi.import_module(module_name, kiwi.runtime.assets.module(module_name).local)
+	module = kiwi.module_cache.load(module_name, kiwi.runtime.assets.module(module_name).local)
 
 	# validate the module
 	if not hasattr(module, 'kiwi_main'):
@@ -29,13 +89,24 @@ def run(kiwi, *args):
 	else:
 
 		# kiwi helper functions and variables
-		helper = kiwi.Helper(module_name, kiwi)
+		helper = kiwi.get_helper(module_name)
+
+		context = kiwi.Context.current()
 
-		# change directory to module directory
-		chdir(helper.module_home)
+		# client modules run from their directory, unless run within a server process, where
+		# requests and scheduled events run in threads and the working directory is shared.
+		# modules run there keep the server's working directory and find their files through
+		# kiwi.module_home, which points at the same directory in every process
+		if kiwi.config.side is kiwi.Side.Client and kiwi.config.process_side is kiwi.Side.Client:
+			chdir(helper.module_home)
 
 		# run the module and log any exceptions coming from it
 		try:
+			if context and context.profile and PROFILING_LOCK.acquire(blocking=False):
+				try:
+					return profiled(kiwi, helper, module.kiwi_main, *args)
+				finally:
+					PROFILING_LOCK.release()
 			return module.kiwi_main(helper, *args)
 		except Exception:
 			ex_type, module_exception, module_traceback = sys.exc_info()
@@ -8,247 +8,2103 @@ from json import dumps, loads
 from daemonize import Daemonize
 from tempfile import mkstemp
 from requests_unixsocket import Session
-from requests.exceptions import ConnectionError
-from urllib.parse import quote
-from threading import Thread
-from time import sleep
-
+from requests.models import Request, Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib.parse import quote, urlsplit, urlencode, parse_qsl
+from threading import Thread, Lock, Condition
+from heapq import heappush, heappop
+from itertools import count
+from math import ceil
+from contextlib import contextmanager, suppress
+from hashlib import sha256
+from io import BytesIO
+from enum import Enum
+from time import perf_counter, sleep, time
+from collections import deque, OrderedDict
+from select import select
+from stat import S_ISSOCK
+
+import ast
 import logging
+import os
 import sys
 import random
 import datetime
 import signal
+import socket
+import tarfile
+import pickle
+import struct
+import resource
+import sqlite3
+import fcntl
+
+from string import ascii_uppercase
+
+from flask import Flask, request, abort, send_from_directory
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import HTTP_STATUS_CODES
+from werkzeug.security import safe_join
+from werkzeug.serving import make_server
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+import jsonpickle
+
+def generate_id():
+	return ''.join(random.choice(ascii_uppercase) for _ in range(10))
+
+KIWI = None
+API = {}
+ASSETS = {}
+BUNDLES = {}
+POOLS = None
+RESPONSE_CACHE = None
+SCHEDULER = None
+
+STREAM_CHUNK_SIZE = 65536
+STREAM_REQUEST_HEADER = 'X-Kiwi-Request'
+STREAM_MARKER_HEADER = 'X-Kiwi-Stream'
+STREAM_HOP_HEADERS = { 'content-length', 'transfer-encoding', 'connection', 'keep-alive' }
+API_LOGGER = None
+CYCLOPS_LOGGER = None
+
+class ServerChildren:
+
+	CHILDREN = []
+	OWNER = getpid()
+
+	@staticmethod
+	def to_be_terminated(pid, name):
+		
+		ServerChildren.CHILDREN.append( (pid, name) )
+
+	@staticmethod
+	def forget(pid):
+
+		ServerChildren.CHILDREN = [ child for child in ServerChildren.CHILDREN if child[0] != pid ]
+
+	@staticmethod
+	def terminate():
+
+		# children inherit signal handlers so a check is necessary
+		if getpid() == ServerChildren.OWNER:
+
+			for child in ServerChildren.CHILDREN:
+
+				try:
+					kill(child[0], 15)
+				except OSError:
+					pass
+
+	@staticmethod
+	def get_handler():
+
+		ServerChildren.OWNER = getpid()
+
+		def _handler(signum, stack):
+
+			ServerChildren.terminate()
+			exit(0)
+
+		return _handler
+
+class Workers:
+
+	# workers which exit sooner than this are considered crashing and are respawned with a delay
+	MIN_LIFETIME = 1
+	POLL_INTERVAL = 0.5
+
+	def __init__(self, name, logger, listener, count, max_requests, metrics):
+		self.name = name
+		self.logger = logger
+		self.listener = listener
+		self.count = count
+		self.max_requests = max_requests
+		self.metrics = metrics
+		self.workers = {}
+		self.socket = None
+
+	def bind(self):
+
+		# listener is bound once and inherited by every worker
+		self.socket = socket.socket(socket.AF_INET6 if ':' in self.listener[0] else socket.AF_INET, socket.SOCK_STREAM)
+		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.socket.bind(self.listener)
+		self.socket.listen(socket.SOMAXCONN)
+		self.socket.setblocking(False)
+
+	@staticmethod
+	def recycled(app, max_requests, stop):
+
+		# no limit
+		if not max_requests:
+			return app
+
+		served = [ 0 ]
+
+		def _app(environ, start_response):
+
+			# stop accepting once the limit is reached, request in progress is still served
+			served[0] += 1
+			if served[0] == max_requests:
+				from gevent import spawn
+				spawn(stop)
+
+			return app(environ, start_response)
+
+		return _app
+
+	def spawn(self, serve):
+
+		pid = fork()
+
+		# worker
+		if pid == 0:
+
+			exit_code = 0
+
+			try:
+
+				# worker is terminated by the supervisor and has no children of its own
+				signal.signal(signal.SIGTERM, signal.SIG_DFL)
+				KIWI.after_fork()
+
+				from gevent import reinit, spawn, socket as gevent_socket
+				reinit()
+
+				spawn(self.published)
+				serve(gevent_socket.socket(fileno=self.socket.fileno()), self.max_requests)
+
+			except BaseException as e:
+				self.logger.error("worker {} crashed: {}".format(getpid(), e))
+				exit_code = 1
+
+			finally:
+				with suppress(Exception):
+					self.metrics.publish(str(getpid()), collected_metrics(self.name))
+				KIWI.Logs.flush()
+				os._exit(exit_code)
+
+		self.workers[pid] = perf_counter()
+		ServerChildren.to_be_terminated(pid, "{} worker".format(self.name))
+		self.logger.info("started worker {}".format(pid))
+
+	def published(self):
+
+		from gevent import sleep as gevent_sleep
+
+		# samples of this worker for the others to add up when scraped
+		snapshot = None
+		while True:
+			snapshot = self.metrics.publish(str(getpid()), collected_metrics(self.name), snapshot)
+			gevent_sleep(Metrics.PUBLISH_INTERVAL)
+
+	def supervise(self, serve):
+
+		self.bind()
+		self.metrics.share(KIWI.Helper.join(KIWI.config.local.home_dir, 'metrics', self.name))
+
+		for _ in range(self.count):
+			self.spawn(serve)
+
+		snapshot = None
+		while True:
+
+			sleep(Workers.POLL_INTERVAL)
+			snapshot = self.metrics.publish('supervisor', supervisor_metrics(self.name), snapshot)
+
+			# only own workers are reaped so other children are left to their owners
+			for pid, started in list(self.workers.items()):
+
+				try:
+					reaped_pid, status = os.waitpid(pid, os.WNOHANG)
+				except ChildProcessError:
+					reaped_pid, status = pid, -1
+
+				if reaped_pid == 0:
+					continue
+
+				status = os.waitstatus_to_exitcode(status) if status > 0 else status
+
+				del self.workers[pid]
+				ServerChildren.forget(pid)
+				self.metrics.retire(str(pid))
+
+				if status == 0:
+					self.logger.info("worker {} recycled after {} requests".format(pid, self.max_requests))
+				else:
+					self.logger.warning("worker {} exited with status {}".format(pid, status))
+
+					if perf_counter() - started < Workers.MIN_LIFETIME:
+						sleep(Workers.MIN_LIFETIME)
+
+				self.spawn(serve)
+
+class ModulePools:
+
+	class Timeout(Exception):
+		pass
+
+	class Crashed(Exception):
+		pass
+
+	class Worker:
+
+		def __init__(self, pid, channel):
+			self.pid = pid
+			self.channel = channel
+
+	class Pool:
+
+		# latency samples kept per pool
+		SAMPLES = 1024
+
+		def __init__(self, pools, module, size, timeout_seconds, memory_limit_mb):
+
+			from gevent.queue import Queue
+
+			self.pools = pools
+			self.module = module
+			self.size = size
+			self.timeout_seconds = timeout_seconds
+			self.memory_limit_mb = memory_limit_mb
+			self.workers = {}
+			self.idle = Queue()
+			self.queued = 0
+			self.latencies = deque(maxlen=ModulePools.Pool.SAMPLES)
+			self.counters = { "requests": 0, "errors": 0, "timeouts": 0, "restarts": 0 }
+
+		def start(self):
+			for _ in range(self.size):
+				self.spawn()
+
+		def spawn(self):
+
+			parent_end, child_end = socket.socketpair()
+			pid = fork()
+
+			# worker
+			if pid == 0:
+				parent_end.close()
+				self.pools.close_channels()
+				ModulePools.release_sockets([ child_end.fileno() ] + KIWI.Logs.descriptors())
+				self.work(child_end)
+
+			child_end.close()
+
+			# parent end is waited on cooperatively
+			from gevent import socket as gevent_socket
+			worker = ModulePools.Worker(pid, gevent_socket.socket(fileno=parent_end.detach()))
+
+			self.workers[pid] = worker
+			self.idle.put(worker)
+			ServerChildren.to_be_terminated(pid, "{} pool worker".format(self.module))
+
+		def work(self, channel):
+
+			try:
+
+				# pool workers are terminated by their parent or exit once it is gone
+				signal.signal(signal.SIGTERM, signal.SIG_DFL)
+				KIWI.after_fork()
+
+				if self.memory_limit_mb:
+					limit = self.memory_limit_mb * 1024 * 1024
+					resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+				# worker is forked off a request greenlet, so greenlets of other requests come along with
+				# the gevent hub. Requests are served on a thread of its own, which gets a hub of its own,
+				# so those copies never run here even when a module yields to gevent
+				serving = Thread(target=self.serve, args=(channel,))
+				serving.start()
+				serving.join()
+
+			finally:
+				KIWI.Logs.flush()
+				os._exit(0)
+
+		def serve(self, channel):
+
+			# import module ahead of the first request
+			with KIWI.Context(argv=[ self.module ], side=KIWI.Side.Server):
+				KIWI.module_cache.load(self.module, KIWI.runtime.assets.module(self.module).local)
+
+			while True:
+
+				message = ModulePools.receive(channel)
+				if message is None:
+					break
+
+				try:
+					reply = (True, run_serverside(self.module, *message))
+				except BaseException as e:
+					reply = (False, "{}: {}".format(type(e).__name__, e))
+
+				ModulePools.send(channel, reply)
+
+		def replace(self, worker):
+
+			# worker is either stuck or gone
+			try:
+				kill(worker.pid, signal.SIGKILL)
+			except OSError:
+				pass
+
+			try:
+				os.waitpid(worker.pid, 0)
+			except ChildProcessError:
+				pass
+
+			worker.channel.close()
+			del self.workers[worker.pid]
+			ServerChildren.forget(worker.pid)
+
+			self.counters["restarts"] += 1
+			self.spawn()
+
+		def dispatch(self, body, environment):
+
+			from gevent import Timeout
+			from gevent.queue import Empty
+
+			start = perf_counter()
+			self.counters["requests"] += 1
+
+			# wait for an idle worker
+			self.queued += 1
+			try:
+				worker = self.idle.get(timeout=self.timeout_seconds)
+			except Empty:
+				self.counters["timeouts"] += 1
+				raise ModulePools.Timeout("no idle '{}' worker within {}s".format(self.module, self.timeout_seconds))
+			finally:
+				self.queued -= 1
+
+			try:
+				with Timeout(self.timeout_seconds - (perf_counter() - start), ModulePools.Timeout):
+					ModulePools.send(worker.channel, (body, environment))
+					reply = ModulePools.receive(worker.channel)
+			except ModulePools.Timeout:
+				self.counters["timeouts"] += 1
+				self.replace(worker)
+				raise
+			except OSError:
+				reply = None
+
+			# worker died mid request
+			if reply is None:
+				self.counters["errors"] += 1
+				self.replace(worker)
+				raise ModulePools.Crashed("'{}' worker exited unexpectedly".format(self.module))
+
+			self.idle.put(worker)
+			self.latencies.append(perf_counter() - start)
+
+			succeeded, payload = reply
+			if not succeeded:
+				self.counters["errors"] += 1
+				raise RuntimeError(payload)
+
+			return payload
+
+		def stats(self):
+
+			latencies = sorted(self.latencies)
+			idle = self.idle.qsize()
+
+			return {
+				"size": self.size,
+				"idle": idle,
+				"busy": len(self.workers) - idle,
+				"queued": self.queued,
+				**self.counters,
+				"latency_ms": {
+					"mean": sum(latencies) / len(latencies) * 1000,
+					"p50": latencies[len(latencies) // 2] * 1000,
+					"p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+				} if latencies else None
+			}
+
+	def __init__(self, config):
+		self.config = config
+		self.pools = {}
+
+	@property
+	def enabled(self):
+		return self.config.enabled
+
+	def settings(self, module):
+
+		settings = {
+			"size": self.config.size,
+			"timeout_seconds": self.config.timeout_seconds,
+			"memory_limit_mb": self.config.memory_limit_mb
+		}
+
+		# per module overrides are listed as { "module": <name>, <setting>: <value>, ... }
+		for override in self.config.overrides:
+			if override.get("module") == module:
+				settings.update({ key: value for key, value in override.items() if key in settings })
+
+		return settings
+
+	def pool(self, module):
+
+		# pool is registered before its workers are spawned so they close the channels of their siblings
+		if module not in self.pools:
+			self.pools[module] = ModulePools.Pool(self, module, **self.settings(module))
+			self.pools[module].start()
+
+		return self.pools[module]
+
+	def close_channels(self):
+		for pool in self.pools.values():
+			for worker in pool.workers.values():
+				worker.channel.close()
+
+	def stats(self):
+		return { module: pool.stats() for module, pool in self.pools.items() }
+
+	@staticmethod
+	def release_sockets(keep):
+
+		# sockets inherited from the api process (its listener, client connections) are replaced by /dev/null,
+		# so the port and connections are not held open by workers. Descriptors stay taken so objects
+		# of the parent which still refer to them can never close one reused by the worker
+		devnull = os.open(os.devnull, os.O_RDWR)
+
+		for fd in listdir('/proc/self/fd'):
+
+			fd = int(fd)
+			if fd in keep or fd == devnull:
+				continue
+
+			try:
+				if S_ISSOCK(os.fstat(fd).st_mode):
+					os.dup2(devnull, fd)
+			except OSError:
+				pass
+
+		os.close(devnull)
+
+	@staticmethod
+	def send(channel, message):
+		data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+		channel.sendall(struct.pack('!I', len(data)) + data)
+
+	@staticmethod
+	def receive(channel):
+
+		header = ModulePools._read(channel, 4)
+		if header is None:
+			return None
+
+		data = ModulePools._read(channel, struct.unpack('!I', header)[0])
+		return pickle.loads(data) if data is not None else None
+
+	@staticmethod
+	def _read(channel, size):
+
+		chunks = []
+
+		while size:
+			chunk = channel.recv(min(size, 1048576))
+			if not chunk:
+				return None
+			chunks.append(chunk)
+			size -= len(chunk)
+
+		return b''.join(chunks)
+
+class ServerHelper:
+
+	class Ingress:
+
+		class Mode(Enum):
+			InProcess = "inprocess"
+			Socket = "socket"
+
+		class Body:
+
+			# file-like view over an iterator of chunks, holds at most one chunk beyond what is read
+			def __init__(self, chunks, close=None):
+				self.chunks = iter(chunks)
+				self.buffer = bytearray()
+				self._close = close
+
+			def read(self, size=-1):
+
+				while size is None or size < 0 or len(self.buffer) < size:
+					chunk = next(self.chunks, None)
+					if chunk is None:
+						break
+					self.buffer += chunk
+
+				if size is None or size < 0:
+					size = len(self.buffer)
+
+				data = bytes(self.buffer[:size])
+				del self.buffer[:size]
+				return data
+
+			def readline(self, size=-1):
+
+				limited = size is not None and size >= 0
+
+				# buffer chunks until a line ends, only newly added bytes are searched
+				end = self.buffer.find(b'\n')
+				while end < 0 and not (limited and len(self.buffer) >= size):
+					chunk = next(self.chunks, None)
+					if chunk is None:
+						break
+					searched = len(self.buffer)
+					self.buffer += chunk
+					end = self.buffer.find(b'\n', searched)
+
+				length = end + 1 if end >= 0 else len(self.buffer)
+				if limited:
+					length = min(length, size)
+
+				data = bytes(self.buffer[:length])
+				del self.buffer[:length]
+				return data
+
+			def close(self):
+				if self._close:
+					self._close()
+					self._close = None
+
+		def __init__(self, request, environment, mode=Mode.InProcess, stream=False):
+			self.environment = environment
+			self.mode = mode
+			self.stream = stream
+			self.socket_fd, self.socket_path = mkstemp() if self.mode is self.Mode.Socket else (None, None)
+
+			# take care of slash edge cases
+			if request.url:
+				request.url = request.url if request.url[0] != '/' else request.url[1:]
+			else:
+				request.url = ''
+
+			# set url to unix socket (or a placeholder host when dispatching in process) and prepare
+			if self.mode is self.Mode.Socket:
+				request.url = "http+unix://{}/{}".format(quote(self.socket_path, safe=''), request.url)
+			else:
+				request.url = "http://localhost/{}".format(request.url)
+			self.request = request.prepare()
+
+		def __del__(self):
+			if self.socket_fd is None:
+				return
+
+			try:
+				close(self.socket_fd)
+				remove(self.socket_path)
+			except OSError:
+				pass
+
+			self.socket_fd = None
+
+		def handle(self, app):
+			return self._handle_socket(app) if self.mode is self.Mode.Socket else self._handle_in_process(app)
+
+		def _handle_in_process(self, app):
+
+			try:
+
+				# streamed request bodies are handed to the app as they arrive
+				body = self.request.body
+				streamed = body is not None and not isinstance(body, (bytes, str))
+				if streamed and not hasattr(body, 'read'):
+					body = self.Body(body)
+
+				# turn prepared request into a WSGI environ
+				url = urlsplit(self.request.url)
+				environ = EnvironBuilder(path=url.path,
+										 query_string=url.query,
+										 method=self.request.method,
+										 headers=list(self.request.headers.items()),
+										 data=body if not streamed else None,
+										 environ_overrides={ 'kiwi.ingress.environment': self.environment }).get_environ()
+
+				# unseekable stream of unknown length is read by the app until exhausted
+				if streamed:
+					environ.pop('CONTENT_LENGTH', None)
+					environ['wsgi.input'] = body
+					environ['wsgi.input_terminated'] = True
+
+				# call the app directly
+				app_iter, status, headers = run_wsgi_app(app, environ, buffered=not self.stream)
+
+				# build the same response object a socket session would return
+				response = Response()
+				status_code, _, response.reason = status.partition(' ')
+				response.status_code = int(status_code)
+				response.headers = CaseInsensitiveDict(headers)
+				response.encoding = get_encoding_from_headers(response.headers)
+				response.url = self.request.url
+				response.request = self.request
+
+				# streamed response body is produced by the app as it is read
+				if self.stream:
+					response.raw = self.Body(app_iter, getattr(app_iter, 'close', None))
+					response._content = False
+				else:
+					response._content = b''.join(app_iter)
+
+				return response
+
+			except:
+				return None
+
+		def _handle_socket(self, app):
+
+			# bind server to unix socket before querying it
+			try:
+				server = make_server("unix://{}".format(self.socket_path), 0, app)
+			except:
+				return None
+			Thread(target=server.serve_forever, kwargs={ 'poll_interval': 0.01 }, daemon=True).start()
+
+			# new socket session
+			socket_session = Session()
+
+			try:
+				return socket_session.send(request=self.request)
+			except:
+				return None
+			finally:
+				socket_session.close()
+				server.shutdown()
+				server.server_close()
+
+	def __init__(self, request, environment, mode=Ingress.Mode.InProcess, stream=False):
+		self.ingress = self.Ingress(request, environment, mode, stream)
+
+	@staticmethod
+	def environment(environ):
+
+		# plain values of the wsgi environment which can be passed on to another process
+		return { key: value for key, value in environ.items() if isinstance(value, (str, int, float, bool, tuple)) }
+
+	def __del__(self):
+		self.ingress.__del__()
+
+class Cyclops:
+
+	class Cron:
+
+		# minute, hour, day of month, month, day of week (0 and 7 are sunday)
+		FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+		# no match within this many days means the expression never fires (e.g. february 30th)
+		HORIZON_DAYS = 366 * 5
+
+		def __init__(self, expression):
+
+			fields = expression.split()
+			if len(fields) != len(Cyclops.Cron.FIELDS):
+				raise ValueError("cron expression '{}' must have {} fields".format(expression, len(Cyclops.Cron.FIELDS)))
+
+			self.expression = expression
+			self.minutes, self.hours, self.days, self.months, weekdays = [ Cyclops.Cron._parse(field, *bounds) for field, bounds in zip(fields, Cyclops.Cron.FIELDS) ]
+			self.weekdays = { weekday % 7 for weekday in weekdays }
+
+			# restricted day of month and day of week match either one, as in cron
+			self.either_day = fields[2] != '*' and fields[4] != '*'
+
+		@staticmethod
+		def _parse(field, low, high):
+
+			values = set()
+
+			for part in field.split(','):
+
+				part, _, step = part.partition('/')
+				step = int(step) if step else 1
+
+				if part == '*':
+					start, end = low, high
+				elif '-' in part:
+					start, end = [ int(bound) for bound in part.split('-', 1) ]
+				else:
+					start = int(part)
+					end = high if step > 1 else start
+
+				if not low <= start <= end <= high or step < 1:
+					raise ValueError("invalid cron field '{}'".format(field))
+
+				values.update(range(start, end + 1, step))
+
+			return values
+
+		def _day_matches(self, date):
+
+			day = date.day in self.days
+			weekday = date.isoweekday() % 7 in self.weekdays
+
+			return (day or weekday) if self.either_day else (day and weekday)
+
+		def next(self, after):
+
+			# first matching minute strictly after given timestamp, whole fields are skipped at once
+			date = datetime.datetime.fromtimestamp(after).replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+			horizon = date + datetime.timedelta(days=Cyclops.Cron.HORIZON_DAYS)
+
+			while date < horizon:
+
+				if date.month not in self.months:
+					date = (date.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+				elif not self._day_matches(date):
+					date = date.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+				elif date.hour not in self.hours:
+					date = date.replace(minute=0) + datetime.timedelta(hours=1)
+				elif date.minute not in self.minutes:
+					date += datetime.timedelta(minutes=1)
+				else:
+					return date.timestamp()
+
+			return None
+
+	class Event:
+
+		EXECUTORS = ("thread", "process")
+
+		def __init__(self, module, arguments="", start=None, cron=None, interval=None, id=None, executor="thread", timeout=None):
+
+			if cron and interval:
+				raise ValueError("event can either recur by cron or by interval")
+
+			if executor not in Cyclops.Event.EXECUTORS:
+				raise ValueError("event executor must be one of: {}".format(', '.join(Cyclops.Event.EXECUTORS)))
+
+			self.id = id or generate_id()
+			self.module = module
+			self.arguments = arguments
+			self.start = Cyclops.Event.timestamp(start) if start is not None else time()
+			self.cron = Cyclops.Cron(cron) if cron else None
+			self.interval = float(interval) if interval else None
+			self.executor = executor
+			self.timeout = float(timeout) if timeout else None
+			self.due = None
+
+			if self.interval is not None and self.interval <= 0:
+				raise ValueError("event interval must be positive")
+
+		@staticmethod
+		def timestamp(value):
+
+			# epoch seconds or an ISO 8601 date
+			if isinstance(value, str):
+				try:
+					return float(value)
+				except ValueError:
+					return datetime.datetime.fromisoformat(value).timestamp()
+
+			return float(value)
+
+		def first(self, now):
+
+			start = max(self.start, now) if self.cron or self.interval else self.start
+
+			if self.cron:
+				return self.cron.next(start - 0.000001)
+
+			# next interval tick which is not in the past
+			if self.interval and now > self.start:
+				return self.start + ceil((now - self.start) / self.interval) * self.interval
+
+			return start
+
+		def following(self, due, now):
+
+			# missed occurences are skipped rather than fired in a burst
+			if self.cron:
+				return self.cron.next(max(due, now))
+
+			if self.interval:
+				return due + max(1, ceil((now - due) / self.interval)) * self.interval
+
+			return None
+
+		def to_dict(self):
+			return {
+				"id": self.id,
+				"module": self.module,
+				"arguments": self.arguments,
+				"start": self.start,
+				"cron": self.cron.expression if self.cron else None,
+				"interval": self.interval,
+				"executor": self.executor,
+				"timeout": self.timeout,
+				"due": self.due
+			}
+
+		@staticmethod
+		def from_dict(event_dict):
+			return Cyclops.Event(module=event_dict["module"],
+								 arguments=event_dict.get("arguments") or "",
+								 start=event_dict.get("start"),
+								 cron=event_dict.get("cron"),
+								 interval=event_dict.get("interval"),
+								 id=event_dict.get("id"),
+								 executor=event_dict.get("executor") or "thread",
+								 timeout=event_dict.get("timeout"))
+
+	class Store:
+
+		SCHEMA = [
+			"""CREATE TABLE IF NOT EXISTS events (
+				id TEXT PRIMARY KEY,
+				module TEXT NOT NULL,
+				arguments TEXT NOT NULL,
+				start REAL NOT NULL,
+				cron TEXT,
+				interval REAL,
+				executor TEXT NOT NULL DEFAULT 'thread',
+				timeout REAL,
+				due REAL NOT NULL
+			)""",
+			"CREATE INDEX IF NOT EXISTS events_due ON events (due)"
+		]
+
+		# columns added after the table was first introduced
+		MIGRATIONS = {
+			"executor": "ALTER TABLE events ADD COLUMN executor TEXT NOT NULL DEFAULT 'thread'",
+			"timeout": "ALTER TABLE events ADD COLUMN timeout REAL"
+		}
+
+		COLUMNS = "id, module, arguments, start, cron, interval, executor, timeout, due"
+
+		def __init__(self, path):
+
+			# single connection shared by the scheduler and the api threads
+			self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+			self.lock = Lock()
+
+			with self.lock:
+				self.connection.execute("PRAGMA journal_mode=WAL")
+				self.connection.execute("PRAGMA synchronous=NORMAL")
+				for statement in Cyclops.Store.SCHEMA:
+					self.connection.execute(statement)
+
+				columns = { row[1] for row in self.connection.execute("PRAGMA table_info(events)") }
+				for column, statement in Cyclops.Store.MIGRATIONS.items():
+					if column not in columns:
+						self.connection.execute(statement)
+
+		@staticmethod
+		def _event(row):
+
+			event = Cyclops.Event.from_dict(dict(zip([ column.strip() for column in Cyclops.Store.COLUMNS.split(',') ], row)))
+			event.due = row[-1]
+			return event
+
+		@staticmethod
+		def _row(event):
+			return (event.id, event.module, event.arguments, event.start, event.cron.expression if event.cron else None, event.interval, event.executor, event.timeout, event.due)
+
+		def _query(self, query, parameters=()):
+			with self.lock:
+				return self.connection.execute(query, parameters).fetchall()
+
+		def insert(self, events):
+
+			# all events of a bulk request are committed at once
+			with self.lock:
+				self.connection.execute("BEGIN")
+				try:
+					self.connection.executemany("INSERT INTO events ({}) VALUES ({})".format(Cyclops.Store.COLUMNS, ', '.join('?' * len(Cyclops.Store.COLUMNS.split(',')))),
+												[ Cyclops.Store._row(event) for event in events ])
+				except:
+					self.connection.execute("ROLLBACK")
+					raise
+				self.connection.execute("COMMIT")
+
+		def delete(self, event_id):
+			with self.lock:
+				return self.connection.execute("DELETE FROM events WHERE id = ?", (event_id,)).rowcount > 0
+
+		def reschedule(self, event_id, due):
+			with self.lock:
+				self.connection.execute("UPDATE events SET due = ? WHERE id = ?", (due, event_id))
+
+		def get(self, event_id):
+			rows = self._query("SELECT {} FROM events WHERE id = ?".format(Cyclops.Store.COLUMNS), (event_id,))
+			return Cyclops.Store._event(rows[0]) if rows else None
+
+		def list(self, limit=-1, offset=0):
+			return [ Cyclops.Store._event(row) for row in self._query("SELECT {} FROM events ORDER BY due LIMIT ? OFFSET ?".format(Cyclops.Store.COLUMNS), (limit, offset)) ]
+
+		def due_before(self, horizon):
+			return [ Cyclops.Store._event(row) for row in self._query("SELECT {} FROM events WHERE due < ? ORDER BY due".format(Cyclops.Store.COLUMNS), (horizon,)) ]
+
+		def count(self):
+			return self._query("SELECT COUNT(*) FROM events")[0][0]
+
+	class Executor:
+
+		class Run:
+
+			def __init__(self, event, mode):
+				self.event = event
+				self.mode = mode
+				self.started = time()
+				self.timed_out = False
+
+			def to_dict(self):
+				return {
+					"id": self.event.id,
+					"module": self.event.module,
+					"mode": self.mode,
+					"running_seconds": time() - self.started,
+					"timed_out": self.timed_out
+				}
+
+		def __init__(self, threads, processes, timeout_seconds, backlog):
+			self.slots = { "thread": threads, "process": processes }
+			self.timeout_seconds = timeout_seconds
+			self.backlog_size = backlog
+			self.running = {}
+			self.backlog = OrderedDict()
+			self.lock = Lock()
+			self.counters = { "started": 0, "finished": 0, "failed": 0, "timed_out": 0, "skipped": 0, "dropped": 0 }
+
+		def _mode(self, event):
+
+			# process runs fall back to threads if no process slots are configured
+			return event.executor if self.slots[event.executor] > 0 else "thread"
+
+		def _free(self, mode):
+			return sum(1 for run in self.running.values() if run.mode == mode) < self.slots[mode]
+
+		def submit(self, event):
+
+			with self.lock:
+
+				# a recurring event which is still running or waiting is not run again
+				if event.id in self.running or event.id in self.backlog:
+					self.counters["skipped"] += 1
+					CYCLOPS_LOGGER.warning("still {}, skipping this occurence".format("running" if event.id in self.running else "in backlog"), extra=KIWI.Logs.fields(event=event.id, module=event.module))
+					return
+
+				mode = self._mode(event)
+				if self._free(mode):
+					self._start(event, mode)
+					return
+
+				# executors are saturated
+				if len(self.backlog) >= self.backlog_size:
+					dropped, _ = self.backlog.popitem(last=False)
+					self.counters["dropped"] += 1
+					CYCLOPS_LOGGER.error("backlog is full, dropped oldest waiting event", extra=KIWI.Logs.fields(event=dropped))
+
+				self.backlog[event.id] = (event, time())
+				CYCLOPS_LOGGER.warning("executors saturated", extra=KIWI.Logs.fields(event=event.id, mode=mode, backlog=len(self.backlog)))
+
+		def _start(self, event, mode):
+
+			self.running[event.id] = Cyclops.Executor.Run(event, mode)
+			self.counters["started"] += 1
+			Thread(target=self._execute, args=(self.running[event.id],), daemon=True).start()
+
+		def _drain(self):
+
+			# waiting events are started in order as their kind of slot frees up
+			for event_id, (event, _) in list(self.backlog.items()):
+				mode = self._mode(event)
+				if self._free(mode):
+					del self.backlog[event_id]
+					self._start(event, mode)
+
+		def _execute(self, run):
+
+			event = run.event
+			timeout = event.timeout or self.timeout_seconds
+			start = perf_counter()
+			fields = KIWI.Logs.fields(event=event.id, module=event.module)
+
+			try:
+				with CYCLOPS_METRICS.timed("kiwi_cyclops_run_seconds", { "module": event.module, "mode": run.mode }):
+					output = self._run_process(run, timeout) if run.mode == "process" else self._run_thread(run, timeout)
+				with self.lock:
+					self.counters["finished"] += 1
+				CYCLOPS_LOGGER.info("finished after {:.3f}s".format(perf_counter() - start), extra=fields)
+				if output:
+					CYCLOPS_LOGGER.info("output: {}".format(output.strip()), extra=fields)
+			except BaseException as e:
+				with self.lock:
+					self.counters["failed"] += 1
+				CYCLOPS_LOGGER.error("failed: {}".format(e), extra=fields)
+			finally:
+				with self.lock:
+					del self.running[event.id]
+					self._drain()
+
+		def _timed_out(self, run):
+			run.timed_out = True
+			with self.lock:
+				self.counters["timed_out"] += 1
+
+		def _run_thread(self, run, timeout):
+
+			result = {}
+
+			def _run():
+				try:
+					result["output"] = KIWI.run_module(run.event.module, run.event.arguments, client=True, foreground=False)[1]
+				except BaseException as e:
+					result["error"] = e
+
+			worker = Thread(target=_run, daemon=True)
+			worker.start()
+			worker.join(timeout)
+
+			# threads can not be interrupted - the run keeps its slot until it returns
+			if worker.is_alive():
+				self._timed_out(run)
+				CYCLOPS_LOGGER.error("timed out after {}s, waiting for it to return".format(timeout), extra=KIWI.Logs.fields(event=run.event.id, module=run.event.module))
+				worker.join()
+
+			if "error" in result:
+				raise result["error"]
+
+			return result.get("output")
+
+		def _run_process(self, run, timeout):
+
+			read_end, write_end = os.pipe()
+			pid = fork()
+
+			# run module and pass its output back through the pipe
+			if pid == 0:
+				exit_code = 1
+				try:
+					os.close(read_end)
+					signal.signal(signal.SIGTERM, signal.SIG_DFL)
+					KIWI.after_fork()
+
+					# forked runs are alone in their process so they run from the module directory
+					os.chdir(KIWI.get_helper(run.event.module).module_home)
+					output = KIWI.run_module(run.event.module, run.event.arguments, client=True, foreground=False)[1]
+					with os.fdopen(write_end, 'w') as output_pipe:
+						output_pipe.write(output)
+					exit_code = 0
+				finally:
+					KIWI.Logs.flush()
+					os._exit(exit_code)
+
+			os.close(write_end)
+			ServerChildren.to_be_terminated(pid, "cyclops {}".format(run.event.id))
+
+			chunks = []
+			deadline = perf_counter() + timeout
+
+			try:
+				while True:
+
+					remaining = deadline - perf_counter()
+					ready = select([ read_end ], [], [], max(remaining, 0))[0] if remaining > 0 else []
+
+					# process runs are killed once over their timeout
+					if not ready:
+						self._timed_out(run)
+						kill(pid, signal.SIGKILL)
+						raise TimeoutError("killed after {}s".format(timeout))
+
+					chunk = os.read(read_end, 65536)
+					if not chunk:
+						break
+					chunks.append(chunk)
+
+			finally:
+				os.close(read_end)
+				_, status = os.waitpid(pid, 0)
+				ServerChildren.forget(pid)
+
+			if status != 0:
+				raise RuntimeError("process exited with status {}".format(os.waitstatus_to_exitcode(status)))
+
+			return b''.join(chunks).decode('utf-8', errors='replace')
+
+		def stats(self):
+			with self.lock:
+				return {
+					"slots": self.slots,
+					"running": [ run.to_dict() for run in self.running.values() ],
+					"backlog": [ { "id": event.id, "module": event.module, "waiting_seconds": time() - queued } for event, queued in self.backlog.values() ],
+					**self.counters
+				}
+
+	class Scheduler:
+
+		# only events due within this many seconds are held in memory
+		WINDOW = 60
+
+		def __init__(self, store, executor):
+			self.store = store
+			self.executor = executor
+			self.events = {}
+			self.heap = []
+			self.horizon = 0
+			self.sequence = count()
+			self.condition = Condition()
+
+		def _push(self, event):
+			heappush(self.heap, (event.due, next(self.sequence), event.id))
+
+		def _load_window(self, now):
+
+			# events due before the new horizon are fetched by the due index
+			self.horizon = now + Cyclops.Scheduler.WINDOW
+			for event in self.store.due_before(self.horizon):
+				if event.id not in self.events:
+					self.events[event.id] = event
+					self._push(event)
+
+		def catch_up(self):
+
+			# recurring events missed while down are moved to their next occurence, one-shot events fire right away
+			now = time()
+			for event in self.store.due_before(now):
+				if event.cron or event.interval:
+					self.store.reschedule(event.id, event.following(event.due, now))
+
+		def add(self, events):
+
+			now = time()
+
+			for event in events:
+				event.due = event.first(now)
+				if event.due is None:
+					raise ValueError("event '{}' never fires".format(event.id))
+
+			with self.condition:
+
+				self.store.insert(events)
+
+				# events beyond the horizon are picked up once the window reaches them
+				for event in events:
+					if event.due < self.horizon:
+						self.events[event.id] = event
+						self._push(event)
+
+				self.condition.notify()
+
+			return events
+
+		def remove(self, event_id):
+
+			# heap entry is dropped lazily once it surfaces
+			with self.condition:
+
+				if not self.store.delete(event_id):
+					return False
+
+				self.events.pop(event_id, None)
+				self.condition.notify()
+
+			return True
+
+		def _next_due(self):
+
+			while True:
+
+				# drop entries of removed or rescheduled events
+				while self.heap and (self.heap[0][2] not in self.events or self.events[self.heap[0][2]].due != self.heap[0][0]):
+					heappop(self.heap)
 
-from string import ascii_uppercase
+				now = time()
+				if now >= self.horizon:
+					self._load_window(now)
+					continue
 
-from flask import Flask, request, abort, send_from_directory
-from werkzeug.exceptions import HTTPException
-from werkzeug.serving import run_simple
+				# sleep until the earliest event is due, the window moves or the schedule changes
+				timeout = min(self.heap[0][0], self.horizon) - now if self.heap else self.horizon - now
+				if self.heap and self.heap[0][0] <= now:
+					break
 
-import jsonpickle
+				self.condition.wait(timeout)
 
-def generate_id():
-	return ''.join(random.choice(ascii_uppercase) for _ in range(10))
+			due, _, event_id = heappop(self.heap)
+			event = self.events[event_id]
 
-KIWI = None
-API = {}
-ASSETS = {}
-API_LOGGER = None
-CYCLOPS_LOGGER = None
+			# recurring events are pushed back with their next occurence, one-shot events are done
+			event.due = event.following(due, time())
+			if event.due is None:
+				del self.events[event_id]
+				self.store.delete(event_id)
+			else:
+				self.store.reschedule(event_id, event.due)
+				if event.due < self.horizon:
+					self._push(event)
+				else:
+					del self.events[event_id]
 
-class ServerChildren:
+			return event, due
 
-	CHILDREN = []
+		def run(self):
 
-	@staticmethod
-	def to_be_terminated(pid, name):
-		
-		ServerChildren.CHILDREN.append( (pid, name) )
+			CYCLOPS_LOGGER.info("scheduler started with {} events".format(self.store.count()))
+
+			while True:
+
+				with self.condition:
+					event, due = self._next_due()
+
+				CYCLOPS_LOGGER.info("due (late by {:.3f}s)".format(time() - due), extra=KIWI.Logs.fields(event=event.id, module=event.module))
+				self.executor.submit(event)
 
 	@staticmethod
-	def get_handler():
+	def start_scheduler():
 
-		def _handler(signum, stack):
+		global SCHEDULER
 
-			# children inherit signal handlers so a check is necessary
-			if getpid() not in ServerChildren.CHILDREN:
+		schedule = KIWI.config.local.server.cyclops.schedule
+		legacy_schedule = None
 
-				for child in ServerChildren.CHILDREN:
+		# schedules kept as json by older versions are imported once
+		if schedule.endswith('.json'):
+			legacy_schedule, schedule = schedule, schedule[:-len('.json')] + '.db'
 
-					kill(child[0], 15)
+		# ensure schedule file directory
+		KIWI.Helper.ensure_directory(dirname(schedule))
 
-			exit(0)
+		store = Cyclops.Store(schedule)
+		executor = KIWI.config.local.server.cyclops.executor
+		SCHEDULER = Cyclops.Scheduler(store, Cyclops.Executor(executor.threads, executor.processes, executor.timeout_seconds, executor.backlog))
 
-		return _handler
+		if legacy_schedule and exists(legacy_schedule):
 
-class ServerHelper:
+			CYCLOPS_LOGGER.info("importing schedule file at '{}' into '{}'".format(legacy_schedule, schedule))
 
-	class Ingress:
+			with open(legacy_schedule, 'r') as schedule_file:
+				SCHEDULER.add([ Cyclops.Event.from_dict(event_dict) for event_dict in loads(schedule_file.read() or "[]") ])
 
-		def __init__(self, request, environment):
-			self.request = request
-			self.environment = environment
-			self.socket_fd, self.socket_path = mkstemp()
+			os.replace(legacy_schedule, legacy_schedule + '.imported')
 
-			# take care of slash edge cases
-			if self.request.url:
-				self.request.url = self.request.url if request.url[0] != '/' else self.request.url[1:]
-			else:
-				self.request.url = ''
+		SCHEDULER.catch_up()
 
-			# set url to unix socket and prepare
-			request.url = "http+unix://{}/{}".format(quote(self.socket_path, safe=''), request.url)
-			self.request = request.prepare()
+		Thread(target=SCHEDULER.run, daemon=True).start()
+
+class ResponseCache:
+
+	# modules opt in by declaring e.g. kiwi_cache = { "ttl": 60, "environ": [ "REMOTE_ADDR" ] } in their server.py
+	METHODS = { 'GET', 'HEAD' }
+	ENTRY_OVERHEAD = 256
+
+	def __init__(self, config):
+		self.enabled = config.enabled
+		self.memory_limit = config.memory_limit_mb * 1024 * 1024
+		self.entry_limit = config.max_entry_kb * 1024
+		self.entries = OrderedDict()
+		self.size = 0
+		self.counters = { "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0 }
+		self.policies = {}
+		self.lock = Lock()
+
+	def policy(self, module):
+
+		if not self.enabled or not KIWI.is_installed(module):
+			return None
+
+		# policy is kept until the module file changes
+		path = KIWI.runtime.assets.module(module).local
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+
+		signature = (path, stat.st_mtime_ns, stat.st_size)
+		cached = self.policies.get(module)
+		if cached is None or cached[0] != signature:
+			cached = self.policies[module] = (signature, ResponseCache.declared(path))
+
+		return cached[1]
+
+	@staticmethod
+	def declared(path):
+
+		# declaration is read from the module source, modules are not imported by the api process
+		try:
+			with open(path, 'rb') as module_file:
+				tree = ast.parse(module_file.read(), path)
+		except (OSError, SyntaxError, ValueError):
+			return None
+
+		for node in tree.body:
+
+			targets = node.targets if isinstance(node, ast.Assign) else [ node.target ] if isinstance(node, ast.AnnAssign) and node.value else []
+			if not any(isinstance(target, ast.Name) and target.id == 'kiwi_cache' for target in targets):
+				continue
 
-		def __del__(self):
 			try:
-				close(self.socket_fd)
-				remove(self.socket_path)
-			except OSError:
-				pass
+				policy = ast.literal_eval(node.value)
+			except (ValueError, TypeError, SyntaxError, RecursionError):
+				return None
 
-		def handle(self, app):
+			# malformed declarations leave the module uncached rather than failing its requests
+			if not isinstance(policy, dict):
+				return None
 
-			# run server on unix socket
-			def run_server():
-				run_simple("unix://{}".format(self.socket_path), port=8080, application=app)
-			Thread(target=run_server, daemon=True).start()
+			ttl, environ = policy.get('ttl'), policy.get('environ', [])
+			if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or not ttl > 0:
+				return None
+			if not isinstance(environ, list) or not all(isinstance(name, str) for name in environ):
+				return None
 
-			# new socket session
-			socket_session = Session()
+			return policy
 
-			# query socket until received a valid response
-			while True:
-				try:
-					return socket_session.send(request=self.request)
-				except ConnectionError:
-					sleep(0.1)
-				except:
-					return None
-				finally:
-					socket_session.close()
+		return None
 
-	def __init__(self, request, environment):
-		self.ingress = self.Ingress(request, environment)
+	def key(self, module, request_, environ, policy):
 
-	def __del__(self):
-		self.ingress.__del__()
+		# only idempotent requests without a body are cached
+		if (request_.method or 'GET').upper() not in ResponseCache.METHODS or request_.data or request_.json or request_.files:
+			return None
 
-class Cyclops:
+		url = urlsplit(request_.url or '/')
+		params = request_.params.items() if isinstance(request_.params, dict) else (request_.params or [])
+		query = sorted(parse_qsl(url.query, keep_blank_values=True) + [ (str(name), str(value)) for name, value in params ])
 
-	class Event:
-		
-		def __init__(self, date):
+		# responses are encoded differently for clients which accept the binary codec
+		binary = any(mimetype == KIWI.Codec.CONTENT_TYPE for mimetype, _ in request.accept_mimetypes)
 
-			self.date = date
+		return sha256(dumps([ module, request_.method.upper() if request_.method else 'GET', url.path or '/', urlencode(query),
+							  [ str(environ.get(name, '')) for name in policy.get('environ', []) ], binary ]).encode('utf-8')).hexdigest()
+
+	def get(self, key):
+
+		with self.lock:
+
+			entry = self.entries.get(key)
+			if entry is None:
+				self.counters["misses"] += 1
+				return None
+
+			expires, body, mimetype = entry
+			if expires <= time():
+				self._remove(key)
+				self.counters["expirations"] += 1
+				self.counters["misses"] += 1
+				return None
+
+			self.entries.move_to_end(key)
+			self.counters["hits"] += 1
+
+		return api.response_class(body, mimetype=mimetype)
+
+	def put(self, key, ttl, response):
+
+		body = response.get_data()
+		if len(body) > self.entry_limit:
+			return
+
+		with self.lock:
+
+			if key in self.entries:
+				self._remove(key)
+
+			self.entries[key] = (time() + ttl, body, response.mimetype)
+			self.size += len(body) + ResponseCache.ENTRY_OVERHEAD
+			self.counters["stores"] += 1
+
+			# least recently used entries go first once over the memory limit
+			while self.size > self.memory_limit and self.entries:
+				self._remove(next(iter(self.entries)))
+				self.counters["evictions"] += 1
+
+	def _remove(self, key):
+		_, body, _ = self.entries.pop(key)
+		self.size -= len(body) + ResponseCache.ENTRY_OVERHEAD
+
+	def stats(self):
+
+		with self.lock:
+			lookups = self.counters["hits"] + self.counters["misses"]
+			return {
+				"enabled": self.enabled,
+				"entries": len(self.entries),
+				"bytes": self.size,
+				"hit_ratio": self.counters["hits"] / lookups if lookups else 0.0,
+				**self.counters
+			}
+
+class AssetIndex:
+
+	def __init__(self):
+		self.files = {}
+		self._lock = Lock()
+
+	def _file(self, path):
+
+		stat = os.stat(path)
+		signature = (stat.st_mtime_ns, stat.st_size)
+
+		with self._lock:
+			cached = self.files.get(path)
+
+		# digest and content are only re-read once a file changes
+		if cached is None or cached['signature'] != signature:
+			with open(path, 'rb') as file_:
+				content = file_.read()
+
+			cached = {
+				'signature': signature,
+				'size': stat.st_size,
+				'sha256': sha256(content).hexdigest(),
+				'text': content.decode('utf-8', 'replace') if len(content) <= 4096 else None
+			}
+
+			with self._lock:
+				self.files[path] = cached
+
+		return cached
+
+	def digest(self, path):
+		return self._file(path)['sha256']
+
+	def modules(self):
+
+		index = {}
+		modules_dir = KIWI.config.local.client.modules_dir
+
+		for module in sorted(listdir(modules_dir)):
+			module_dir = KIWI.Helper.join(modules_dir, module)
+			if not isdir(module_dir):
+				continue
+
+			# available sides with their sizes and digests
+			sides = {}
+			for side in KIWI.Side:
+				side_path = KIWI.Helper.join(module_dir, side.value)
+				if isfile(side_path):
+					side_file = self._file(side_path)
+					sides[side.value] = { "size": side_file['size'], "sha256": side_file['sha256'] }
+
+			meta_path = KIWI.Helper.join(module_dir, "meta.txt")
+			index[module] = {
+				"sides": sides,
+				"description": self._file(meta_path)['text'] if isfile(meta_path) else None
+			}
+
+		return index
+
+class Metrics:
+
+	# latency histogram bucket bounds in seconds
+	BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+	DESCRIPTIONS = {
+		"kiwi_requests_total": ("counter", "Handled HTTP requests by component, endpoint, module and status code"),
+		"kiwi_request_seconds": ("histogram", "HTTP request latency by component and endpoint"),
+		"kiwi_requests_in_flight": ("gauge", "HTTP requests currently being handled by component"),
+		"kiwi_module_stage_seconds": ("histogram", "Serverside module request latency by module and stage"),
+		"kiwi_asset_bytes_total": ("counter", "Bytes of assets served by kind"),
+		"kiwi_module_cache_modules": ("gauge", "Modules held by the module cache"),
+		"kiwi_module_cache_total": ("counter", "Module cache hits, misses and reloads"),
+		"kiwi_pool_workers": ("gauge", "Module pool workers by module and state"),
+		"kiwi_pool_events_total": ("counter", "Module pool requests, errors, timeouts and restarts by module"),
+		"kiwi_cyclops_events": ("gauge", "Scheduled cyclops events"),
+		"kiwi_cyclops_executor": ("gauge", "Cyclops executor runs by state"),
+		"kiwi_cyclops_executor_events_total": ("counter", "Cyclops executor outcomes by kind"),
+		"kiwi_cyclops_run_seconds": ("histogram", "Cyclops event run duration by module and executor"),
+		"kiwi_response_cache": ("gauge", "Response cache entries and bytes"),
+		"kiwi_response_cache_events_total": ("counter", "Response cache hits, misses, stores, evictions and expirations"),
+		"kiwi_log_records": ("gauge", "Log records waiting to be written"),
+		"kiwi_log_records_total": ("counter", "Log records written or dropped on a full queue"),
+		"kiwi_log_handlers": ("gauge", "Log handlers attached to loggers")
+	}
+
+	# snapshots of pre-forked workers are published at most this often
+	PUBLISH_INTERVAL = 1
+
+	def __init__(self):
+		self.lock = Lock()
+		self.values = {}
+		self.histograms = {}
+		self.directory = None
 
 	@staticmethod
-	def start_reconciler():
+	def _key(name, labels):
+		return (name, tuple(sorted((labels or {}).items())))
 
-		# cyclops reconcile loop
-		def _reconcile_loop():
+	def inc(self, name, labels=None, value=1):
+		key = Metrics._key(name, labels)
+		with self.lock:
+			self.values[key] = self.values.get(key, 0) + value
 
-			# a single reconcile with the next alarm setup
-			def _reconcile(signum, stack):
+	def observe(self, name, labels, value):
 
-				# schedule the next reconcile
-				loop_next_date = datetime.datetime.now()
-				loop_next_date = loop_next_date.replace(minute=loop_next_date.minute + 1, second=0, microsecond=0)
-				delta = loop_next_date - datetime.datetime.now()
-				signal.alarm(int(delta.total_seconds()) + 1)
-				CYCLOPS_LOGGER.info("next reconcile in {}s".format(delta.total_seconds()))
+		key = Metrics._key(name, labels)
+		with self.lock:
 
-				# let child take care of the loop
-				if fork() == 0:
+			# per bucket counts followed by sum and count
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				histogram = self.histograms[key] = [ 0 ] * (len(Metrics.BUCKETS) + 2)
 
-					# generate reconcile id and mark start time
-					reconcile_id = generate_id()
-					reconcile_start_date = datetime.datetime.now()
-					CYCLOPS_LOGGER.info("{}: reconciling...".format(reconcile_id))
+			for index, bound in enumerate(Metrics.BUCKETS):
+				if value <= bound:
+					histogram[index] += 1
+					break
 
-					# reconcile
-					with open(KIWI.config.local.server.cyclops.schedule, 'r') as schedule_file:
-						pass # TODO reconcile logic
+			histogram[-2] += value
+			histogram[-1] += 1
 
-					# wrap up reconcile
-					reconcile_time_elapsed = datetime.datetime.now() - reconcile_start_date
-					CYCLOPS_LOGGER.info("{}: reconcile over after {}s".format(reconcile_id, reconcile_time_elapsed.total_seconds()))
+	@contextmanager
+	def timed(self, name, labels):
+		start = perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(name, labels, perf_counter() - start)
 
-					exit(0)
+	@staticmethod
+	def _labels(labels):
 
-			# handle reconcile alarm
-			signal.signal(signal.SIGALRM, _reconcile)
+		if not labels:
+			return ""
 
-			# set up alarm at the start of the next minute
-			next_loop = datetime.datetime.now()
-			next_loop = next_loop.replace(minute=next_loop.minute + 1, second=0, microsecond=0)
-			delta = next_loop - datetime.datetime.now()
-			signal.alarm(int(delta.total_seconds()) + 1)
-			CYCLOPS_LOGGER.info("starting reconcile loop in {}s".format(delta.total_seconds()))
+		escaped = [ (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels ]
+		return "{" + ",".join('{}="{}"'.format(name, value) for name, value in escaped) + "}"
 
-			while True:
-				signal.pause()
+	def snapshot(self, collected=()):
 
-		# ensure schedule file directory
-		KIWI.Helper.ensure_directory(dirname(KIWI.config.local.server.cyclops.schedule))
+		with self.lock:
+			values = dict(self.values)
+			histograms = { key: list(histogram) for key, histogram in self.histograms.items() }
+
+		for name, labels, value in collected:
+			key = Metrics._key(name, labels)
+			values[key] = values.get(key, 0) + value
+
+		return values, histograms
+
+	@staticmethod
+	def _add(snapshot, other, counters_only=False):
+
+		values, histograms = snapshot
+		for key, value in other[0].items():
+			if not counters_only or Metrics.DESCRIPTIONS.get(key[0], ("untyped", ))[0] != "gauge":
+				values[key] = values.get(key, 0) + value
+
+		for key, histogram in other[1].items():
+			histograms[key] = [ a + b for a, b in zip(histograms[key], histogram) ] if key in histograms else list(histogram)
+
+		return snapshot
+
+	def share(self, directory):
+
+		# pre-forked workers each keep their own samples, they are published here and added up on scrape
+		KIWI.Helper.ensure_directory(directory)
+		for name in listdir(directory):
+			remove(KIWI.Helper.join(directory, name))
+
+		self.directory = directory
+
+	@contextmanager
+	def _locked(self, operation):
+		with open(KIWI.Helper.join(self.directory, '.lock'), 'a') as lock_file:
+			fcntl.flock(lock_file, operation)
+			yield
+
+	def _load(self, name):
+		try:
+			with open(KIWI.Helper.join(self.directory, name), 'rb') as snapshot_file:
+				return pickle.load(snapshot_file)
+		except (OSError, EOFError, pickle.UnpicklingError):
+			return None
+
+	def _store(self, name, snapshot):
+		path = KIWI.Helper.join(self.directory, name)
+		with open(KIWI.Helper.join(self.directory, '.' + name), 'wb') as snapshot_file:
+			pickle.dump(snapshot, snapshot_file)
+		os.replace(KIWI.Helper.join(self.directory, '.' + name), path)
+
+	def publish(self, name, collected=(), last=None):
+
+		# unchanged snapshots are not written again
+		snapshot = self.snapshot(collected)
+		if snapshot != last:
+			self._store(name, snapshot)
+
+		return snapshot
+
+	def retire(self, name):
+
+		# counters of a worker which is gone are kept so totals do not reset when workers are recycled
+		with self._locked(fcntl.LOCK_EX):
+
+			snapshot = self._load(name)
+			if snapshot is not None:
+				self._store('retired', Metrics._add(self._load('retired') or ({}, {}), snapshot, counters_only=True))
+
+			with suppress(FileNotFoundError):
+				remove(KIWI.Helper.join(self.directory, name))
+
+	def render(self, collected=()):
+
+		# samples grouped by metric name in text exposition format
+		samples = {}
+
+		if self.directory is None:
+			values, histograms = self.snapshot(collected)
+
+		# every worker of the component added up, this one with its current samples
+		else:
+			self.publish(str(getpid()), collected)
+			values, histograms = {}, {}
+			with self._locked(fcntl.LOCK_SH):
+				for name in listdir(self.directory):
+					snapshot = self._load(name) if not name.startswith('.') else None
+					if snapshot is not None:
+						Metrics._add((values, histograms), snapshot)
 
-		# init schedule file if needed
-		if not exists(KIWI.config.local.server.cyclops.schedule):
+		for (name, labels), value in values.items():
+			samples.setdefault(name, []).append("{}{} {}".format(name, Metrics._labels(labels), value))
 
-			CYCLOPS_LOGGER.info("initiating schedule file at '{}'".format(KIWI.config.local.server.cyclops.schedule))
+		for (name, labels), histogram in histograms.items():
 
-			with open(KIWI.config.local.server.cyclops.schedule, 'w') as schedule_file:
-				schedule_file.write("[]")
+			lines = samples.setdefault(name, [])
+			cumulative = 0
+			for bound, bucket in zip(Metrics.BUCKETS, histogram):
+				cumulative += bucket
+				lines.append("{}_bucket{} {}".format(name, Metrics._labels(labels + (("le", bound),)), cumulative))
 
-		# spawn cyclops process
-		cyclops_pid = fork()
+			lines.append("{}_bucket{} {}".format(name, Metrics._labels(labels + (("le", "+Inf"),)), histogram[-1]))
+			lines.append("{}_sum{} {}".format(name, Metrics._labels(labels), histogram[-2]))
+			lines.append("{}_count{} {}".format(name, Metrics._labels(labels), histogram[-1]))
 
-		# start reconcile loop
-		if cyclops_pid == 0:
-			_reconcile_loop()
+		output = []
+		for name in sorted(samples):
+			kind, description = Metrics.DESCRIPTIONS.get(name, ("untyped", name))
+			output.append("# HELP {} {}".format(name, description))
+			output.append("# TYPE {} {}".format(name, kind))
+			output.extend(samples[name])
 
-		ServerChildren.to_be_terminated(cyclops_pid, "cyclops")
+		return "\n".join(output) + "\n"
+
+ASSET_INDEX = AssetIndex()
+API_METRICS = Metrics()
+CYCLOPS_METRICS = Metrics()
 
 api = Flask(__name__[:-3] + "_api")
 cyclops = Flask(__name__[:-3] + "_cyclops")
 
-@cyclops.route('/event', methods = ['GET'])
+def instrument(app, component, metrics):
+
+	@app.before_request
+	def _before():
+		request.environ['kiwi.metrics.start'] = perf_counter()
+		metrics.inc("kiwi_requests_in_flight", { "component": component })
+
+	@app.after_request
+	def _after(response):
+
+		# route templates keep label cardinality bounded
+		endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+		module = (request.view_args or {}).get('module', '')
+
+		metrics.inc("kiwi_requests_total", { "component": component, "endpoint": endpoint, "module": metric_module(module) if module else "", "status": response.status_code })
+		metrics.observe("kiwi_request_seconds", { "component": component, "endpoint": endpoint }, perf_counter() - request.environ.get('kiwi.metrics.start', perf_counter()))
+
+		if request.endpoint in ASSET_ENDPOINTS and response.content_length:
+			metrics.inc("kiwi_asset_bytes_total", { "kind": ASSET_ENDPOINTS[request.endpoint] }, response.content_length)
+
+		return response
+
+	@app.teardown_request
+	def _teardown(exception):
+		metrics.inc("kiwi_requests_in_flight", { "component": component }, -1)
+
+def metric_module(module):
+
+	# arbitrary module names in urls are not turned into series
+	return module if KIWI.is_installed(module) else "unknown"
+
+def collected_metrics(component):
+
+	# gauges and counters kept by other parts of the serving process, read at scrape time
+	collected = []
+
+	if component == "api":
+
+		if RESPONSE_CACHE is not None:
+			stats = RESPONSE_CACHE.stats()
+			for kind in ("entries", "bytes"):
+				collected.append(("kiwi_response_cache", { "kind": kind }, stats[kind]))
+			for kind in ("hits", "misses", "stores", "evictions", "expirations"):
+				collected.append(("kiwi_response_cache_events_total", { "kind": kind }, stats[kind]))
+
+		stats = KIWI.module_cache.stats()
+		collected.append(("kiwi_module_cache_modules", {}, stats["modules"]))
+		for kind in ("hits", "misses", "reloads"):
+			collected.append(("kiwi_module_cache_total", { "kind": kind }, stats[kind]))
+
+		if POOLS is not None:
+			for module, stats in POOLS.stats().items():
+				for state in ("idle", "busy", "queued"):
+					collected.append(("kiwi_pool_workers", { "module": module, "state": state }, stats[state]))
+				for kind in ("requests", "errors", "timeouts", "restarts"):
+					collected.append(("kiwi_pool_events_total", { "module": module, "kind": kind }, stats[kind]))
+
+	return collected
+
+def supervisor_metrics(component):
+
+	# gauges and counters kept by the process the component was started in, published by it to pre-forked workers
+	collected = []
+
+	logs = KIWI.Logs.stats()
+	collected.append(("kiwi_log_records", {}, logs["queued"]))
+	collected.append(("kiwi_log_handlers", {}, logs["handlers"]))
+	for kind in ("written", "dropped"):
+		collected.append(("kiwi_log_records_total", { "kind": kind }, logs[kind]))
+
+	if component == "cyclops" and SCHEDULER is not None:
+
+		collected.append(("kiwi_cyclops_events", {}, SCHEDULER.store.count()))
+
+		stats = SCHEDULER.executor.stats()
+		collected.append(("kiwi_cyclops_executor", { "state": "running" }, len(stats["running"])))
+		collected.append(("kiwi_cyclops_executor", { "state": "backlog" }, len(stats["backlog"])))
+		for kind in ("started", "finished", "failed", "timed_out", "skipped", "dropped"):
+			collected.append(("kiwi_cyclops_executor_events_total", { "kind": kind }, stats[kind]))
+
+	return collected
+
+def rendered_metrics(component, metrics):
+	return metrics.render(collected_metrics(component) + (supervisor_metrics(component) if metrics.directory is None else []))
+
+@api.route('/metrics')
+def api_metrics():
+	return api.response_class(rendered_metrics("api", API_METRICS), mimetype='text/plain; version=0.0.4')
+
+@cyclops.route('/metrics')
+def cyclops_metrics():
+	return cyclops.response_class(rendered_metrics("cyclops", CYCLOPS_METRICS), mimetype='text/plain; version=0.0.4')
+
+@cyclops.route('/event', methods = ['POST'])
 def cyclops_create_event():
-	return "It's alive!"
+
+	# single event or a list of events to create at once
+	payload = request.get_json(silent=True)
+	bulk = isinstance(payload, list)
+
+	try:
+		events = SCHEDULER.add([ Cyclops.Event.from_dict(event_dict) for event_dict in (payload if bulk else [ payload ]) ])
+	except (KeyError, TypeError, ValueError, AttributeError, sqlite3.IntegrityError) as e:
+		CYCLOPS_LOGGER.error("invalid event: {}".format(e))
+		abort(400)
+
+	if bulk:
+		CYCLOPS_LOGGER.info("scheduled {} events".format(len(events)))
+	else:
+		CYCLOPS_LOGGER.info("scheduled for {}".format(datetime.datetime.fromtimestamp(events[0].due).isoformat()), extra=KIWI.Logs.fields(event=events[0].id, module=events[0].module))
+
+	return dumps([ event.to_dict() for event in events ] if bulk else events[0].to_dict(), indent=4), 201
+
+@cyclops.route('/event', methods = ['GET'])
+def cyclops_list_events():
+	return dumps([ event.to_dict() for event in SCHEDULER.store.list(request.args.get('limit', -1, type=int), request.args.get('offset', 0, type=int)) ], indent=4)
+
+@cyclops.route('/event/backlog', methods = ['GET'])
+def cyclops_backlog():
+	return dumps(SCHEDULER.executor.stats(), indent=4)
+
+@cyclops.route('/event/<event_id>', methods = ['GET'])
+def cyclops_get_event(event_id):
+
+	event = SCHEDULER.store.get(event_id)
+	if event is None:
+		abort(404)
+
+	return dumps(event.to_dict(), indent=4)
+
+@cyclops.route('/event/<event_id>', methods = ['DELETE'])
+def cyclops_delete_event(event_id):
+
+	if not SCHEDULER.remove(event_id):
+		abort(404)
+
+	CYCLOPS_LOGGER.info("removed", extra=KIWI.Logs.fields(event=event_id))
+	return '', 204
+
+def run_serverside(module, request_, environment, stream=False):
+
+	# various server helpers
+	serverHelper = ServerHelper(request_,
+								environment,
+								ServerHelper.Ingress.Mode(KIWI.config.local.server.api.ingress),
+								stream)
+
+	# get response from serverside module, a sample of requests is profiled
+	profile = random.random() < KIWI.config.local.server.api.profile_sample_rate
+	response = KIWI.run_module(module, "", serverHelper, client=False, profile=profile)
+
+	# finalize server helper object
+	serverHelper.__del__()
+
+	return response
+
+def dispatch_serverside(module, request_):
+
+	# dispatch to a warm worker pool of an installed module
+	if POOLS.enabled and KIWI.is_installed(module):
+		return POOLS.pool(module).dispatch(request_, ServerHelper.environment(request.environ))
+
+	# run within the api process
+	return run_serverside(module, request_, request.environ.copy())
+
+def decode_payload():
+
+	# binary codec if negotiated, jsonpickle otherwise
+	if request.mimetype == KIWI.Codec.CONTENT_TYPE:
+		return KIWI.Codec.decode(request.get_data())
+
+	return jsonpickle.decode(request.get_json())
+
+def encode_payload(payload):
+
+	# binary codec only for clients which explicitly accept it
+	if any(mimetype == KIWI.Codec.CONTENT_TYPE for mimetype, _ in request.accept_mimetypes):
+		try:
+			return api.response_class(KIWI.Codec.encode(payload), mimetype=KIWI.Codec.CONTENT_TYPE)
+		except KIWI.Codec.Unsupported:
+			pass
+
+	return jsonpickle.encode(payload)
+
+def failed_response(status_code):
+
+	# stands in for a batched request which could not be served
+	response = Response()
+	response.status_code = status_code
+	response.reason = HTTP_STATUS_CODES.get(status_code)
+	response._content = b''
+	return response
 
 @api.route('/module/<module>/', methods = ['POST'])
 def module(module):
 
 	# generate request ID
 	request_id = generate_id()
+	fields = KIWI.Logs.fields(request=request_id, module=module)
 
 	try:
 
 		# aknowledge request
-		API_LOGGER.info("{}: received serverside request for '{}' module".format(request_id, module))
+		API_LOGGER.info("received serverside request", extra=fields)
 
-		# various server helpers
-		API_LOGGER.info("{}: preparing server helpers".format(request_id))
-		serverHelper = ServerHelper(jsonpickle.decode(request.get_json()), request.environ.copy())
+		labels = { "module": metric_module(module) }
 
-		# get response from serverside module
-		API_LOGGER.info("{}: running '{}' serverside".format(request_id, module))
-		response = KIWI.run_module(module, "", serverHelper, client=False)
+		# decode request object
+		with API_METRICS.timed("kiwi_module_stage_seconds", { **labels, "stage": "decode" }):
+			request_ = decode_payload()
+
+		# modules which declare their responses cacheable are only run on a miss
+		policy = RESPONSE_CACHE.policy(module)
+		cache_key = RESPONSE_CACHE.key(module, request_, request.environ, policy) if policy else None
+		cached = RESPONSE_CACHE.get(cache_key) if cache_key else None
+		if cached is not None:
+			API_LOGGER.info("serving cached response", extra=fields)
+			return cached
 
-		# finalize server helper object
-		API_LOGGER.info("{}: finalizing server helpers".format(request_id))
-		serverHelper.__del__()
+		# get response from serverside module
+		API_LOGGER.info("running serverside", extra=fields)
+		with API_METRICS.timed("kiwi_module_stage_seconds", { **labels, "stage": "run" }):
+			response = dispatch_serverside(module, request_)
 
 		# response is not allowed to be None
 		if response is None:
-			API_LOGGER.error("{}: empty response received from '{}' serverside".format(request_id, module))
+			API_LOGGER.error("empty response received from serverside", extra=fields)
 			abort(500)
 
 		# return serialized response object
-		API_LOGGER.info("{}: serializing response".format(request_id))
-		return jsonpickle.encode(response)
-
+		API_LOGGER.info("serializing response", extra=fields)
+		with API_METRICS.timed("kiwi_module_stage_seconds", { **labels, "stage": "serialize" }):
+			payload = api.make_response(encode_payload(response))
+
+		# only successful responses are kept
+		if cache_key and response.status_code == 200:
+			RESPONSE_CACHE.put(cache_key, policy['ttl'], payload)
+
+		return payload
+
+	except ModulePools.Timeout as e:
+		API_LOGGER.error(str(e), extra=fields)
+		abort(504)
+	except ModulePools.Crashed as e:
+		API_LOGGER.error(str(e), extra=fields)
+		abort(502)
 	except HTTPException as e:
-		API_LOGGER.error("{}: HTTP error: {}".format(request_id, e.__str__()))
+		API_LOGGER.error("HTTP error: {}".format(e.__str__()), extra=fields)
 		raise
 	except:
-		API_LOGGER.error("{}: unknown kiwi serverside exception".format(request_id))
+		API_LOGGER.error("unknown kiwi serverside exception", extra=fields)
+		abort(500)
+
+@api.route('/module/<module>/batch/', methods = ['POST'])
+def module_batch(module):
+
+	# generate request ID
+	request_id = generate_id()
+	fields = KIWI.Logs.fields(request=request_id, module=module)
+
+	try:
+		requests_ = decode_payload()
+		assert isinstance(requests_, list)
+	except:
+		API_LOGGER.error("malformed serverside batch", extra=fields)
+		abort(400)
+
+	API_LOGGER.info("received serverside batch", extra=KIWI.Logs.fields(request=request_id, module=module, size=len(requests_)))
+
+	# responses are returned in request order, failed requests are replaced by an error response
+	responses = []
+	labels = { "module": metric_module(module), "stage": "run" }
+	for index, request_ in enumerate(requests_):
+
+		fields = KIWI.Logs.fields(request=request_id, module=module, index=index)
+
+		try:
+			with API_METRICS.timed("kiwi_module_stage_seconds", labels):
+				response = dispatch_serverside(module, request_)
+			if response is None:
+				API_LOGGER.error("empty response received from serverside", extra=fields)
+				response = failed_response(500)
+		except ModulePools.Timeout as e:
+			API_LOGGER.error(str(e), extra=fields)
+			response = failed_response(504)
+		except ModulePools.Crashed as e:
+			API_LOGGER.error(str(e), extra=fields)
+			response = failed_response(502)
+		except:
+			API_LOGGER.error("unknown kiwi serverside exception", extra=fields)
+			response = failed_response(500)
+
+		responses.append(response)
+
+	API_LOGGER.info("serializing responses", extra=KIWI.Logs.fields(request=request_id, module=module, size=len(responses)))
+	return encode_payload(responses)
+
+@api.route('/module/<module>/stream/', methods = ['POST'])
+def module_stream(module):
+
+	# generate request ID
+	request_id = generate_id()
+	fields = KIWI.Logs.fields(request=request_id, module=module)
+
+	API_LOGGER.info("received streaming serverside request", extra=fields)
+
+	# request line and headers travel in a header, the http body is the request body itself
+	try:
+		metadata = loads(request.headers.get(STREAM_REQUEST_HEADER, '{}'))
+		headers = metadata.get('headers') or {}
+		if request.content_type and 'Content-Type' not in headers:
+			headers['Content-Type'] = request.content_type
+
+		# stream is bound here as the request proxy resolves to the module app while it runs
+		stream = request.stream
+		body = iter(lambda: stream.read(STREAM_CHUNK_SIZE), b'')
+		request_ = Request(method=metadata.get('method', 'GET'),
+						   url=metadata.get('url'),
+						   headers=headers,
+						   params=metadata.get('params') or {},
+						   data=body)
+	except (ValueError, TypeError, AttributeError):
+		API_LOGGER.error("malformed streaming request", extra=fields)
+		abort(400)
+
+	# streamed requests always run within the api process as pools pass whole payloads
+	try:
+		API_LOGGER.info("running serverside", extra=fields)
+		with API_METRICS.timed("kiwi_module_stage_seconds", { "module": metric_module(module), "stage": "run" }):
+			response = run_serverside(module, request_, request.environ.copy(), stream=True)
+	except:
+		API_LOGGER.error("unknown kiwi serverside exception", extra=fields)
+		abort(500)
+
+	# response is not allowed to be None
+	if response is None:
+		API_LOGGER.error("empty response received from serverside", extra=fields)
 		abort(500)
 
+	def _body():
+		try:
+			for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+				yield chunk
+		finally:
+			response.close()
+
+	# module status and headers are passed on as is, the marker tells them apart from kiwi errors
+	API_LOGGER.info("streaming response", extra=fields)
+	headers = [ (name, value) for name, value in response.headers.items() if name.lower() not in STREAM_HOP_HEADERS ]
+	return api.response_class(_body(), status=response.status_code, headers=headers + [ (STREAM_MARKER_HEADER, '1') ])
+
+@api.route('/stats/pools/')
+def module_pool_stats():
+	return dumps(POOLS.stats(), indent=4)
+
+@api.route('/stats/cache/')
+def response_cache_stats():
+	return dumps(RESPONSE_CACHE.stats(), indent=4)
+
+@api.route('/stats/modules/')
+def module_cache_stats():
+	return dumps(KIWI.module_cache.stats(), indent=4)
+
+def index_json(path):
+
+	index = ASSET_INDEX.modules()
+
+	# single module entry if specified
+	if path:
+		path = path.strip('/')
+		if path not in index:
+			abort(404)
+		return dumps(index[path], indent=4)
+
+	return dumps(index, indent=4)
+
 def runtime_json(path):
 	return assets_json(KIWI.config.local.client.runtime_dir, path)
 
 def runtime_asset(path):
-	return send_from_directory(KIWI.config.local.client.runtime_dir, path)
+	return send_asset(KIWI.config.local.client.runtime_dir, path)
 
 def modules_json(path):
 	return assets_json(KIWI.config.local.client.modules_dir, path)
 
 def modules_asset(path):
-	return send_from_directory(KIWI.config.local.client.modules_dir, path)
+	return send_asset(KIWI.config.local.client.modules_dir, path)
 
 def kiwi_asset():
-	return send_from_directory(KIWI.config.local.client.runtime_dir, 'kiwi')
+	return send_asset(KIWI.config.local.client.runtime_dir, 'kiwi')
+
+def modules_bundle(names):
+
+	side = request.args.get('side', KIWI.Side.Client.value)
+
+	# module side and description of each module
+	return [ (KIWI.Helper.join(name, filename), safe_join(KIWI.config.local.client.modules_dir, name, filename))
+			 for name in names for filename in [side, "meta.txt"] ]
+
+def runtime_bundle(names):
+	return [ (name, safe_join(KIWI.config.local.client.runtime_dir, name)) for name in names ]
+
+def send_asset(source, path):
+
+	abs_path = safe_join(source, path)
+
+	# 404 if file does not exist
+	if abs_path is None or not isfile(abs_path):
+		abort(404)
+
+	# content digest as etag lets clients ask for the file only if it changed
+	return send_from_directory(source, path, etag=ASSET_INDEX.digest(abs_path))
 
 def assets_json(source, path):
 	
@@ -277,6 +2133,17 @@ def assets_json(source, path):
 
 	return dumps(response, indent=4)
 
+# endpoints whose response sizes are counted as served asset bytes
+ASSET_ENDPOINTS = {
+	'serve_api': 'api',
+	'serve_asset': 'assets',
+	'serve_kiwi': 'kiwi',
+	'serve_bundle': 'bundles'
+}
+
+instrument(api, "api", API_METRICS)
+instrument(cyclops, "cyclops", CYCLOPS_METRICS)
+
 @api.route('/api/<asset>/')
 @api.route('/api/<asset>/<path:path>')
 def serve_api(asset, path=''):
@@ -290,6 +2157,34 @@ def serve_asset(asset, path):
 def serve_kiwi():
 	return kiwi_asset()
 
+@api.route('/bundles/<asset>/')
+def serve_bundle(asset):
+
+	if asset not in BUNDLES:
+		abort(404)
+
+	# gather existing requested files
+	files = [ (name, path) for name, path in BUNDLES[asset](request.args.getlist('name')) if path is not None and isfile(path) ]
+	if not files:
+		abort(404)
+
+	# pack files into a compressed archive
+	buffer = BytesIO()
+	with tarfile.open(fileobj=buffer, mode='w:gz') as bundle:
+		for name, path in files:
+
+			with open(path, 'rb') as bundle_file:
+				content = bundle_file.read()
+
+			# symlinks are packed as the files they point to
+			member = tarfile.TarInfo(name)
+			member.size = len(content)
+			member.mtime = int(os.stat(path).st_mtime)
+			member.mode = 0o644
+			bundle.addfile(member, BytesIO(content))
+
+	return api.response_class(buffer.getvalue(), mimetype='application/gzip')
+
 def start_server(apiLogHandler=logging.StreamHandler(sys.stdout), cyclopsLogHandler=logging.StreamHandler(sys.stdout)):
 
 	# return wrapped starter function
@@ -309,9 +2204,8 @@ def start_server(apiLogHandler=logging.StreamHandler(sys.stdout), cyclopsLogHand
 				globals()[component_global_logger_name] = logging.getLogger(component_name)
 				globals()[component_global_logger_name].setLevel(logging.INFO)
 
-				# set up log handler
-				logHandler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-				globals()[component_global_logger_name].addHandler(logHandler)
+				# records are written by the log listener thread
+				KIWI.Logs.attach(globals()[component_global_logger_name], logHandler)
 
 				# enable tls if specified
 				ssl_args = {
@@ -320,29 +2214,55 @@ def start_server(apiLogHandler=logging.StreamHandler(sys.stdout), cyclopsLogHand
 					'ca_certs': component_dict.tls.ca_chain
 				} if component_dict.tls.enabled else {}
 
-				# initialize wsgi server
 				listener = (component_dict.host, component_dict.port)
-				server = WSGIServer(listener, component_app, log=globals()[component_global_logger_name], **ssl_args)
-				globals()[component_global_logger_name].info('listening on {}:{}'.format(listener[0], listener[1]))
+				workers = getattr(component_dict, 'workers', 1)
+
+				def _serve(listener, max_requests=0):
+
+					# initialize wsgi server
+					server = WSGIServer(listener,
+										Workers.recycled(component_app, max_requests, lambda: server.stop()),
+										log=globals()[component_global_logger_name],
+										**ssl_args)
+
+					# serve forever
+					try:
+						server.serve_forever()
+					except KeyboardInterrupt:
+						globals()[component_global_logger_name].warn("received keyboard interrupt")
+					finally:
+						globals()[component_global_logger_name].info("stopping...")
+
+				globals()[component_global_logger_name].info('listening on {}:{}{}'.format(listener[0], listener[1],
+																							" with {} workers".format(workers) if workers > 1 else ""))
 
 				# run auxiliary function for component if provided
 				if component_auxiliary_func:
 					component_auxiliary_func()
 
-				# serve forever
-				try:
-					server.serve_forever()
-				except KeyboardInterrupt:
-					globals()[component_global_logger_name].warn("received keyboard interrupt")
-				finally:
-					globals()[component_global_logger_name].info("stopping...")
+				# single process
+				if workers <= 1:
+					_serve(listener)
+
+				# pre-forked workers sharing the listener
+				else:
+					Workers(component_name,
+							globals()[component_global_logger_name],
+							listener,
+							workers,
+							getattr(component_dict, 'max_requests', 0),
+							API_METRICS if component_name == "api" else CYCLOPS_METRICS).supervise(_serve)
 
 			return _start
 
 		# set up server sigterm handler
 		signal.signal(signal.SIGTERM, ServerChildren.get_handler())
 
+		# workers, pools and process runs are forked off this process, which alone writes the log files
+		KIWI.Logs.serve()
+
 		# run enabled components
+		components = []
 		for component_enabled, run_component in [
 			(KIWI.config.local.server.api.enabled, _start_component_app("api",
 																		KIWI.config.local.server.api,
@@ -350,26 +2270,41 @@ def start_server(apiLogHandler=logging.StreamHandler(sys.stdout), cyclopsLogHand
 																		apiLogHandler,
 																		api,
 																		None)),
-			(False, _start_component_app("cyclops",
+			(KIWI.config.local.server.cyclops.enabled, _start_component_app("cyclops",
 																			KIWI.config.local.server.cyclops,
 																			'CYCLOPS_LOGGER',
 																			cyclopsLogHandler,
 																			cyclops,
-																			Cyclops.start_reconciler))
+																			Cyclops.start_scheduler))
 		]:
 			if component_enabled:
-				Thread(target=run_component, daemon=False).start()
+				components.append(Thread(target=run_component, daemon=True))
+				components[-1].start()
+
+		# main thread waits on components so signals are still handled here
+		try:
+			for component in components:
+				component.join()
+		except KeyboardInterrupt:
+			ServerChildren.terminate()
 
 	return _start_server
 
 def run(kiwi):
 
-	global KIWI, API, ASSETS
+	global KIWI, API, ASSETS, BUNDLES, POOLS, RESPONSE_CACHE
 
 	KIWI = kiwi
 
+	# serverside module worker pools
+	POOLS = ModulePools(KIWI.config.local.server.api.pool)
+
+	# cached responses of modules which declare them cacheable
+	RESPONSE_CACHE = ResponseCache(KIWI.config.local.server.api.cache)
+
 	# api endpoints
 	API = {
+		"index": index_json,
 		"modules": modules_json,
 		"runtime": runtime_json
 	}
@@ -380,6 +2315,12 @@ def run(kiwi):
 		"runtime": runtime_asset
 	}
 
+	# bundle endpoints
+	BUNDLES = {
+		"modules": modules_bundle,
+		"runtime": runtime_bundle
+	}
+
 	# foreground
 	if KIWI.config.local.server.daemon.foreground:
 		start_server()()
@@ -417,21 +2358,13 @@ def run(kiwi):
 			KIWI.Helper.ensure_directory(dirname(log_file))
 
 		# component log handlers
-		api_log_handler = logging.handlers.RotatingFileHandler(filename=KIWI.config.local.server.api.log.path,
-															   maxBytes=KIWI.config.local.server.api.log.rotation.size,
-															   backupCount=KIWI.config.local.server.api.log.rotation.backups)
-		cyclops_log_handler = logging.handlers.RotatingFileHandler(filename=KIWI.config.local.server.cyclops.log.path,
-															   maxBytes=KIWI.config.local.server.cyclops.log.rotation.size,
-															   backupCount=KIWI.config.local.server.cyclops.log.rotation.backups)
+		api_log_handler = KIWI.Logs.file_handler(KIWI.config.local.server.api.log.path, KIWI.config.local.server.api.log.rotation)
+		cyclops_log_handler = KIWI.Logs.file_handler(KIWI.config.local.server.cyclops.log.path, KIWI.config.local.server.cyclops.log.rotation)
 
 		# daemon logger setup
 		daemon_logger = logging.getLogger("daemon")
 		daemon_logger.setLevel(logging.INFO)
-		daemon_log_handler = logging.handlers.RotatingFileHandler(filename=KIWI.config.local.server.daemon.log.path,
-															   	  maxBytes=KIWI.config.local.server.daemon.log.rotation.size,
-															   	  backupCount=KIWI.config.local.server.daemon.log.rotation.backups)
-		daemon_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-		daemon_logger.addHandler(daemon_log_handler)
+		daemon_log_handler = KIWI.Logs.attach_file(daemon_logger, KIWI.config.local.server.daemon.log.path, KIWI.config.local.server.daemon.log.rotation)
 
 		# start daemon
 		KIWI.say('starting daemon...')
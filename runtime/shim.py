@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Thin kiwi entry point for scripts and keybindings which run modules often.
+#
+# Invocations are forwarded to a running agent ('kiwi --agent') along with the
+# working directory, environment and stdio, so the interpreter here only pays for
+# a few standard library imports. Without an agent kiwi runs within this process.
+# The shim itself needs no site packages, so python -S skips their setup as well.
+#
+# Usage: python3 -S ~/.kiwi/runtime/shim.py <kiwi arguments>
+
+import os
+import sys
+import socket
+import signal
+import struct
+from json import dumps
+
+# invocations which are never forwarded
+LOCAL_FLAGS = { '-S', '--start-server', '--agent', '--trace-startup' }
+
+# launcher options followed by a value, or by a list of module names
+VALUE_OPTIONS = { '-c', '--config', '-d', '--dump-config' }
+LIST_OPTIONS = { '-g', '--get-modules', '-u', '--update-modules' }
+
+HOME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KIWI_NAME = os.path.basename(HOME_DIR)[1:]
+
+def receive_int(connection):
+
+	data = b''
+	while len(data) < 4:
+		chunk = connection.recv(4 - len(data))
+		if not chunk:
+			return None
+		data += chunk
+
+	return struct.unpack('!i', data)[0]
+
+def matches(option, options):
+
+	# long options may be abbreviated as with argparse
+	return option in options or option.startswith('--') and len(option) > 2 and any(name.startswith(option) for name in options)
+
+def launcher_options(argv):
+
+	# options given before the module name, the arguments after it belong to the module
+	options = []
+	value = listing = False
+
+	for arg in argv:
+
+		if value:
+			value = False
+			continue
+
+		if arg == '--':
+			break
+
+		if arg == '-' or not arg.startswith('-'):
+			if listing:
+				continue
+			break
+
+		# short options may be grouped, the rest of a group after a value option is its value
+		names = [ arg.split('=', 1)[0] ] if arg.startswith('--') else [ '-' + letter for letter in arg[1:] ]
+		for index, name in enumerate(names):
+			options.append(name)
+			if matches(name, VALUE_OPTIONS):
+				value = '=' not in arg if arg.startswith('--') else index == len(names) - 1
+				break
+
+		listing = matches(options[-1], LIST_OPTIONS)
+
+	return options
+
+def forward(argv):
+
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+		connection.connect(os.path.join(HOME_DIR, 'agent.sock'))
+
+		invocation = dumps({ "argv": argv, "cwd": os.getcwd(), "env": dict(os.environ) }).encode('utf-8')
+		socket.send_fds(connection, [ struct.pack('!I', len(invocation)) + invocation ], [ 0, 1, 2 ])
+
+		# signals meant for the module are passed on to the process running it,
+		# an agent which closes without one has not run anything
+		pid = receive_int(connection)
+		if pid is None:
+			raise ConnectionRefusedError("agent did not take the invocation")
+
+		for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT):
+			signal.signal(signum, lambda signum, _: os.kill(pid, signum))
+
+		exit_code = receive_int(connection)
+		return 1 if exit_code is None else exit_code
+
+def fallback(argv):
+
+	import runpy
+	from shutil import which
+
+	# launcher needs site packages
+	if sys.flags.no_site:
+		import site
+		site.main()
+
+	launcher = os.environ.get('KIWI_LAUNCHER') or which(KIWI_NAME)
+	if not launcher:
+		print("{}: agent is not running and launcher was not found, set KIWI_LAUNCHER".format(KIWI_NAME), file=sys.stderr)
+		return 1
+
+	sys.argv = [ launcher ] + argv
+	runpy.run_path(launcher, run_name='__main__')
+	return 0
+
+def main():
+
+	argv = sys.argv[1:]
+
+	if argv and not any(matches(option, LOCAL_FLAGS) for option in launcher_options(argv)):
+		try:
+			return forward(argv)
+		except (FileNotFoundError, ConnectionError):
+			pass
+
+	return fallback(argv)
+
+if __name__ == "__main__":
+	sys.exit(main())